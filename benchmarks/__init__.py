@@ -0,0 +1 @@
+# Stage-level timing on deterministic synthetic papers: python -m benchmarks --help
@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import time
+import argparse
+import random
+import platform
+import statistics
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import regex as re
+
+from construct_health.analysis import (RE_BOUNDARY, RE_DEF, RE_DESIGN, RE_THEORY, RE_VALIDITY, SENT_PATTERNS,
+                                       analyze_pdf, analyze_text, detect_constructs, detect_measures,
+                                       extract_numbers, find_sents)
+from construct_health.extract import extract_text
+from construct_health.kb import default_index
+from construct_health.matching import LabelMatcher
+from construct_health.text import SentenceTable, focus_spans, section_spans, sentence_spans
+
+from .synth import paper_text, sparse_text, write_pdf
+
+DEFAULT_PAGES = (10, 100, 300, 1000)
+
+def _time(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t)
+    return {"min": min(runs), "median": statistics.median(runs), "runs": runs}
+
+def _find_all(text, focus):
+    # the report's five sentence queries, answered from one shared table
+    table = SentenceTable(text, SENT_PATTERNS, focus)
+    for pat, n in ((RE_DEF, 5), (RE_BOUNDARY, 5), (RE_THEORY, 5), (RE_DESIGN, 5), (RE_VALIDITY, 6)):
+        find_sents(table, pat, n)
+
+def bench_size(pages, repeat, seed, data_dir, pdf=True, workers=None):
+    text, sparse = paper_text(pages, seed), sparse_text(pages, seed)
+    focus, sparse_focus = focus_spans(section_spans(text)), focus_spans(section_spans(sparse))
+    stages = {
+        "sentences": lambda: [sentence_spans(text, s, e) for s, e in focus],
+        "sectionize": lambda: section_spans(text),
+        "detect_constructs": lambda: detect_constructs(text, ranges=focus),
+        "detect_constructs_sparse": lambda: detect_constructs(sparse, ranges=sparse_focus),
+        "detect_measures": lambda: detect_measures(text, ranges=focus),
+        "extract_numbers": lambda: extract_numbers(text, focus),
+        "find_sents": lambda: _find_all(text, focus),
+        "end_to_end_text": lambda: analyze_text(text),
+    }
+    if pdf:
+        path = os.path.join(data_dir, f"synthetic-{pages}p-s{seed}.pdf")
+        if not os.path.exists(path):
+            write_pdf(path, pages, seed)
+        stages = {
+            "extract_text": lambda: extract_text(path, workers=workers, cache=False, back_matter=True),
+            **stages,
+            "end_to_end_pdf": lambda: analyze_pdf(path, workers=workers, cache=False),
+        }
+    out = {"pages": pages, "chars": len(text), "focus_chars": sum(e - s for s, e in focus), "stages": {}}
+    for name, fn in stages.items():
+        out["stages"][name] = _time(fn, repeat)
+        print(f"  {pages:>5}p  {name:<24} median {out['stages'][name]['median'] * 1000:10.2f} ms", file=sys.stderr)
+    return out
+
+# --- cold start: what a CLI run or a pool worker pays before analysing anything
+COLD_IMPORTS = ("construct_health.analysis", "construct_health.cli", "construct_health.jobs")
+HEAVY_MODULES = ("streamlit", "fitz", "pypdf", "yaml")
+
+def _python(*args):
+    return subprocess.run([sys.executable, *args], check=True, capture_output=True, text=True).stdout
+
+def _first_worker_result():
+    from construct_health.extract import pool_context
+    from construct_health.kb import warm
+    ex = ProcessPoolExecutor(max_workers=1, mp_context=pool_context(), initializer=warm)
+    try:
+        ex.submit(os.getpid).result()
+    finally:
+        ex.shutdown()
+
+def bench_cold_start(repeat):
+    # Fresh interpreters importing each entry point ("interpreter" is the bare baseline),
+    # the CLI's --help, and a new pool worker up to its first result (KB compile included;
+    # the first run also starts the forkserver). heavy_modules: optional dependencies an
+    # import drags in, which should be none.
+    stages = {"interpreter": _time(lambda: _python("-c", "pass"), repeat)}
+    heavy = {}
+    for mod in COLD_IMPORTS:
+        stages[f"import {mod}"] = _time(lambda: _python("-c", f"import {mod}"), repeat)
+        probe = f"import sys, {mod}; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+        heavy[mod] = _python("-c", probe).split()
+    stages["cli --help"] = _time(lambda: _python("-m", "construct_health", "--help"), repeat)
+    stages["pool worker"] = _time(_first_worker_result, repeat)
+    for name, v in stages.items():
+        print(f"  cold   {name:<34} median {v['median'] * 1000:10.2f} ms", file=sys.stderr)
+    return {"stages": stages, "heavy_modules": heavy}
+
+# --- correctness: LabelMatcher against the per-label search it replaced
+MATCHER_NOISE = ["", " ", "  ", "\n", "-", "_", ".", ",", "(", "'s", "x", "1", "é", "ß", "İ", "ﬁ"]
+
+def check_label_matcher(labels, trials=2000, seed=0):
+    # Random texts of labels (re-cased, cut short, glued to word characters and
+    # punctuation) and random ranges over them: both matcher paths, direct and
+    # vocabulary, must find exactly the labels re.search(rf'\b{label}\b', re.I) finds
+    # in some range. Raises AssertionError on the first text where they differ.
+    rng = random.Random(seed)
+    paths = {"direct": LabelMatcher(labels, direct_max=len(labels)), "vocabulary": LabelMatcher(labels, direct_max=0)}
+    pats = {lbl: re.compile(rf'\b{re.escape(lbl)}\b', re.I) for lbl in labels}
+    recase = [str, str.lower, str.upper, str.title, lambda w: w[:max(1, len(w) - 2)]]
+    for _ in range(trials):
+        parts = [rng.choice(recase)(rng.choice(labels)) if rng.random() < 0.6 else rng.choice(MATCHER_NOISE)
+                 for _ in range(rng.randint(0, 12))]
+        text = "".join(p + rng.choice(MATCHER_NOISE) for p in parts)
+        cuts = sorted(rng.randint(0, len(text)) for _ in range(2 * rng.randint(0, 2)))
+        ranges = list(zip(cuts[::2], cuts[1::2])) if cuts else None
+        expect = {lbl for lbl, pat in pats.items()
+                  if any(pat.search(text, s, e) for s, e in ranges or [(0, len(text))])}
+        for name, matcher in paths.items():
+            got = matcher.find(text, ranges)
+            assert got == expect, f"{name} matcher on {text!r} {ranges}: {sorted(got ^ expect)} differ"
+    print(f"  check  label matcher == per-label search on {trials} texts", file=sys.stderr)
+    return trials
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(pages=DEFAULT_PAGES, repeat=3, seed=0, data_dir=None, pdf=True, workers=None):
+    meta = {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"), "git": _git_rev(),
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "repeat": repeat, "seed": seed, "workers": workers}
+    kb = default_index()
+    checks = {"label_matcher": check_label_matcher(kb.matcher.labels(), seed=seed)}
+    with tempfile.TemporaryDirectory(prefix="ch-bench-") as tmp:
+        data_dir = data_dir or tmp
+        os.makedirs(data_dir, exist_ok=True)
+        results = [bench_size(n, repeat, seed, data_dir, pdf, workers) for n in pages]
+    return {"meta": meta, "checks": checks, "cold_start": bench_cold_start(repeat), "results": results}
+
+def compare(base, new, out=sys.stdout):
+    # median new/base per stage and size; < 1.0 is faster
+    rows = lambda res: res["results"] + ([{"pages": "cold", **res["cold_start"]}] if "cold_start" in res else [])
+    base_idx = {(r["pages"], s): v["median"] for r in rows(base) for s, v in r["stages"].items()}
+    print(f"{'pages':>6}  {'stage':<34} {'base ms':>10} {'new ms':>10} {'ratio':>7}", file=out)
+    for r in rows(new):
+        for s, v in r["stages"].items():
+            b = base_idx.get((r["pages"], s))
+            if b is None:
+                continue
+            print(f"{r['pages']:>6}  {s:<34} {b * 1000:10.2f} {v['median'] * 1000:10.2f} {v['median'] / b:7.2f}", file=out)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks",
+                                 description="Time each pipeline stage on synthetic papers and save the results as JSON.")
+    ap.add_argument("--pages", type=int, nargs="+", default=list(DEFAULT_PAGES), help="paper sizes in pages")
+    ap.add_argument("--repeat", type=int, default=3, help="timed runs per stage (median and min are reported)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workers", type=int, help="extraction workers (default: CH_EXTRACT_WORKERS or CPU count)")
+    ap.add_argument("--data-dir", help="keep generated PDFs here and reuse them across runs")
+    ap.add_argument("--no-pdf", action="store_true", help="text stages only; skip PDF generation and extraction")
+    ap.add_argument("-o", "--output", help="results JSON (default: stdout)")
+    ap.add_argument("--compare", metavar="BASE", help="print new/base median ratios against an earlier results file")
+    args = ap.parse_args(argv)
+
+    res = run(args.pages, args.repeat, args.seed, args.data_dir, not args.no_pdf, args.workers)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=2)
+    else:
+        json.dump(res, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), res, sys.stderr)
+    return 0
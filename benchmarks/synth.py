@@ -0,0 +1,100 @@
+import random
+import textwrap
+
+import regex as re
+
+from construct_health.kb import load_kb
+
+# Deterministic synthetic papers: same (pages, seed) -> same text and PDF bytes on any
+# machine, so timings from different commits are comparable.
+LINES_PER_PAGE = 46
+CHARS_PER_LINE = 95
+
+SECTIONS = ["Abstract", "Introduction", "Theory", "Method", "Measures", "Participants",
+            "Procedure", "Results", "Discussion", "Conclusion"]
+
+FILLER = ("participants", "reported", "higher", "scores", "across", "conditions", "the", "effect",
+          "was", "moderated", "by", "age", "and", "we", "observed", "that", "students", "in",
+          "both", "samples", "showed", "consistent", "patterns", "over", "time", "with", "a",
+          "small", "but", "reliable", "difference", "between", "groups", "on", "task", "performance")
+
+def _sentence(rng, labels, aliases):
+    kind = rng.random()
+    words = rng.sample(FILLER, rng.randint(6, 14))
+    if kind < 0.08:
+        return f"{rng.choice(labels).capitalize()} is defined as the {' '.join(words)}."
+    if kind < 0.14:
+        return f"{rng.choice(labels).capitalize()} is distinct from {rng.choice(labels)} as {' '.join(words)}."
+    if kind < 0.22:
+        return f"We used the {rng.choice(aliases)} (Smith et al., {rng.randint(1990, 2024)}) and {' '.join(words)}."
+    if kind < 0.28:
+        return (f"Cronbach's alpha = 0.{rng.randint(60, 95)}, omega = 0.{rng.randint(60, 95)} and "
+                f"test-retest = 0.{rng.randint(50, 90)} e.g. for {rng.choice(labels)}.")
+    if kind < 0.33:
+        return (f"The model fit well, CFI = 0.{rng.randint(88, 99)}, TLI = 0.{rng.randint(87, 99)}, "
+                f"RMSEA = 0.0{rng.randint(2, 9)}, SRMR = 0.0{rng.randint(2, 9)}.")
+    if kind < 0.37:
+        return f"A randomized longitudinal experiment tested the dual-systems mechanism, {' '.join(words)}."
+    if kind < 0.40:
+        return f"Scalar invariance and convergent validity held (see Fig. 2), {' '.join(words)}."
+    return " ".join(words).capitalize() + rng.choice([".", ".", ".", "?", "!"])
+
+def _kb_labels():
+    # -> (construct labels, measure aliases)
+    kb_c, kb_m = load_kb()
+    labels = [l for n in kb_c["constructs"].values() for l in n.get("canonical_labels", []) + n.get("near_neighbors", [])]
+    return labels, [a for n in kb_m["measures"].values() for a in n["aliases"]]
+
+def paper_pages(pages, seed=0):
+    # -> list of page texts, each about LINES_PER_PAGE lines of CHARS_PER_LINE characters
+    rng = random.Random(f"{pages}-{seed}")
+    labels, aliases = _kb_labels()
+    body_pages = max(1, pages - max(1, pages // 10))  # last ~10% is the reference list
+    per_section = max(1, body_pages * LINES_PER_PAGE // len(SECTIONS))
+    lines = [f"Synthetic paper {pages}-{seed}: self-control and self-regulation"]
+    for sec in SECTIONS:
+        lines.append(sec)
+        para = []
+        while len(para) < per_section:
+            para += textwrap.wrap(" ".join(_sentence(rng, labels, aliases) for _ in range(8)), CHARS_PER_LINE)
+        lines += para[:per_section]
+    lines.append("References")
+    while len(lines) < pages * LINES_PER_PAGE:
+        lines.append(f"Author, {rng.choice('ABCDEFG')}. ({rng.randint(1980, 2024)}). On {rng.choice(labels)} "
+                     f"and the {rng.choice(aliases)}. Journal of Psychology, {rng.randint(1, 99)}, {rng.randint(1, 900)}.")
+    lines = lines[:pages * LINES_PER_PAGE]
+    return ["\n".join(lines[i:i + LINES_PER_PAGE]) for i in range(0, len(lines), LINES_PER_PAGE)]
+
+def paper_text(pages, seed=0) -> str:
+    return "\n".join(paper_pages(pages, seed))
+
+# --- label-sparse text: the same sections, in made-up words that no KB label or alias
+# uses, so every label is absent. Real papers mention a handful of the KB's labels;
+# this is the far end from paper_text(), which mentions nearly all of them.
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "pe", "da", "fu", "gri", "zo", "bel", "tor")
+
+def sparse_text(pages, seed=0) -> str:
+    rng = random.Random(f"sparse-{pages}-{seed}")
+    taken = {w for l in sum(_kb_labels(), []) for w in re.findall(r'\w+', l.casefold())}
+    words = sorted({"".join(rng.choices(SYLLABLES, k=rng.randint(1, 4))) for _ in range(5000)} - taken)
+    per_section = max(1, pages * LINES_PER_PAGE // len(SECTIONS))
+    lines = [f"Synthetic paper {pages}-{seed}"]
+    for sec in SECTIONS:
+        lines.append(sec)
+        para = []
+        while len(para) < per_section:
+            para += textwrap.wrap(" ".join(" ".join(rng.choices(words, k=rng.randint(6, 14))).capitalize() + "."
+                                           for _ in range(8)), CHARS_PER_LINE)
+        lines += para[:per_section]
+    return "\n".join(lines[:pages * LINES_PER_PAGE])
+
+def write_pdf(path, pages, seed=0):
+    import fitz  # PyMuPDF
+    doc = fitz.open()
+    for text in paper_pages(pages, seed):
+        page = doc.new_page(width=612, height=792)
+        page.insert_textbox(fitz.Rect(36, 36, 576, 756), text, fontsize=8.5, fontname="helv")
+    # fixed metadata/ids so the bytes (and extraction-cache keys) are reproducible
+    doc.set_metadata({"producer": "construct-health benchmarks", "creationDate": "", "modDate": ""})
+    doc.save(path, garbage=3, deflate=True, no_new_id=True)
+    doc.close()
@@ -0,0 +1 @@
+# Construct Health analysis core
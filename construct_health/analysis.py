@@ -0,0 +1,264 @@
+import time
+import regex as re
+from collections import namedtuple
+
+from .extract import Page, iter_pages
+from .kb import default_index
+from .timing import Timings
+from .text import FOCUS_SECS, SECTION_HEAD, SentenceTable, focus_spans, section_name
+
+# Bump whenever the report for the same PDF and KB can change (extraction or analysis);
+# corpus manifests reprocess everything recorded under an older version.
+PIPELINE_VERSION = 9
+
+# --- Patterns
+RE_DEF      = re.compile(r'\b(is\s+defined\s+as|we\s+define|defined\s+as|refers\s+to)\b', re.I)
+RE_BOUNDARY = re.compile(r'\b(distinct\s+from|differs\s+from|as\s+opposed\s+to|not\s+merely|boundary|scope\s+conditions?)\b', re.I)
+RE_THEORY   = re.compile(r'\b(model|mechanism|dual(?:\s+|-)?systems?|process\s+model|expected\s+value\s+of\s+control|valuation)\b', re.I)
+
+RE_DESIGN   = re.compile(r'\b(randomi[sz]ed|experiment|intervention|longitudinal|cross(?:-|\s+)sectional|pre(?:-|\s+)post|RCT)\b', re.I)
+
+# --- numeric indices: index -> (label, separator, value), scanned together in one pass.
+# Add an index here and it is found by the same scan, reported under its name.
+COEF = r'[0]\.\d{2,}|[1](?:\.0+)?'  # reliability coefficient, .xx to 1
+FIT  = r'0\.\d{2,}'
+NUMERIC_INDICES = {
+    "alpha":              (r"cronbach['’]?s?\s*alpha|alpha", r'(?:=|:)?', COEF),
+    "omega":              (r'omega|ω', r'(?:=|:)?', COEF),
+    "test_retest_or_ICC": (r'test[- ]?retest|ICC', r'(?:=|:)?', COEF),
+    "CFI":                (r'CFI', r'(?:=|:)', FIT),
+    "TLI":                (r'TLI', r'(?:=|:)', FIT),
+    "RMSEA":              (r'RMSEA', r'(?:=|:)', FIT),
+    "SRMR":               (r'SRMR', r'(?:=|:)', FIT),
+}
+# signals have no value; a hit just sets <name>_signal
+NUMERIC_SIGNALS = {
+    "invariance": r'\b(configural|metric|scalar|strict)\s+invariance\b|\bmeasurement invariance\b|\bDIF\b',
+}
+# Labels must start a word: the leading \b rejects mid-word positions before the
+# alternation is tried, which keeps one combined scan cheaper than a pass per index.
+RE_NUMERIC = re.compile(r'\b(?:' + "|".join(
+    [rf'(?P<{k}>(?:{label})\s*{sep}\s*(?P<{k}__value>{value}))' for k, (label, sep, value) in NUMERIC_INDICES.items()]
+    + [rf'(?P<{k}>{sig})' for k, sig in NUMERIC_SIGNALS.items()]) + ')', re.I)
+
+# one scanner hit; value is None for signals, sentence is None without a SentenceTable
+NumericHit = namedtuple("NumericHit", "index value offset sentence")
+
+RE_VALIDITY = re.compile(r'\b(convergent|discriminant|criterion|predictive|known(?:-|\s+)groups|response(?:-|\s+)process)\b', re.I)
+
+# sentence-level queries; the report's SentenceTable carries one bit per entry.
+# They run over the unnormalised text, hence \s+ wherever a phrase has a space.
+SENT_PATTERNS = {
+    "definition": RE_DEF,
+    "boundary": RE_BOUNDARY,
+    "theory": RE_THEORY,
+    "design": RE_DESIGN,
+    "validity": RE_VALIDITY,
+}
+
+# --- helpers
+def find_sents(blob, pattern, maxn=6):
+    # blob: text, or a SentenceTable (read from its bitmask when pattern is one of its patterns)
+    table = blob if isinstance(blob, SentenceTable) else SentenceTable(blob)
+    for name, pat in table.patterns.items():
+        if pat is pattern:
+            return table.find(name, maxn)
+    out = []
+    for k in range(len(table)):
+        s = table.sentence(k)
+        if pattern.search(s):
+            out.append(s)
+        if len(out) >= maxn: break
+    return out
+
+def detect_constructs(text, kb=None, found=None, ranges=None):
+    # kb: a KBIndex (default: the process-wide index of KB_DIR)
+    # found: labels already matched in text by kb.matcher, to share one scan
+    # ranges: (start, end) pieces of text to read, e.g. focus_spans(); default all of it
+    kb = kb or default_index()
+    hits = kb.construct_hits(kb.matcher.find(text, ranges) if found is None else found)
+    return {k: sorted(hits[k]) for k in kb.constructs if k in hits}
+
+def detect_measures(text, kb=None, found=None, ranges=None):
+    kb = kb or default_index()
+    best = kb.best_aliases(kb.matcher.find(text, ranges) if found is None else found)
+    return [kb.measure_record(meas, best[meas]) for meas in kb.measures if meas in best]
+
+def map_measures_to_components(found):
+    buckets = {}
+    for item in found:
+        for t in item["targets"]:
+            buckets.setdefault(t, []).append(item["measure"])
+    return {k: sorted(set(v)) for k,v in buckets.items()}
+
+def scan_numbers(blob, table=None, ranges=None):
+    # NumericHits in range order; table: a SentenceTable over blob, to fill in sentence ids
+    for start, end in [(0, len(blob))] if ranges is None else ranges:
+        for m in RE_NUMERIC.finditer(blob, start, end):
+            k = m.lastgroup
+            value = float(m.group(k + "__value")) if k in NUMERIC_INDICES else None
+            yield NumericHit(k, value, m.start(), table.locate(m.start()) if table else None)
+
+def extract_numbers(blob, ranges=None):
+    nums = {k: [] for k in NUMERIC_INDICES}
+    nums.update((k + "_signal", False) for k in NUMERIC_SIGNALS)
+    for hit in scan_numbers(blob, ranges=ranges):
+        if hit.value is None:
+            nums[hit.index + "_signal"] = True
+        else:
+            nums[hit.index].append(hit.value)
+    return nums
+
+def threshold_comments(nums):
+    comments = []
+    def any_ge(vals, thr): return any(v >= thr for v in vals) if vals else False
+    def any_le(vals, thr): return any(v <= thr for v in vals) if vals else False
+
+    if nums["alpha"]:
+        comments.append(f"α values: {nums['alpha']} ⇒ {'OK (≥ .70)' if any_ge(nums['alpha'], .70) else 'low'}")
+    if nums["omega"]:
+        comments.append(f"ω values: {nums['omega']} ⇒ {'OK (≥ .70)' if any_ge(nums['omega'], .70) else 'low'}")
+    if nums["test_retest_or_ICC"]:
+        comments.append(f"Test–retest/ICC: {nums['test_retest_or_ICC']} ⇒ {'OK (≥ .70 typical)' if any_ge(nums['test_retest_or_ICC'], .70) else 'low'}")
+    if nums["CFI"]:
+        comments.append(f"CFI: {nums['CFI']} ⇒ {'OK (≥ .95 good, ≥ .90 acceptable)' if any_ge(nums['CFI'], .90) else 'poor'}")
+    if nums["TLI"]:
+        comments.append(f"TLI: {nums['TLI']} ⇒ {'OK (≥ .95/.90)' if any_ge(nums['TLI'], .90) else 'poor'}")
+    if nums["RMSEA"]:
+        comments.append(f"RMSEA: {nums['RMSEA']} ⇒ {'OK (≤ .06 good, ≤ .08 acceptable)' if any_le(nums['RMSEA'], .08) else 'high'}")
+    if nums["SRMR"]:
+        comments.append(f"SRMR: {nums['SRMR']} ⇒ {'OK (≤ .08 typical)' if any_le(nums['SRMR'], .08) else 'high'}")
+    if nums["invariance_signal"]:
+        comments.append("Measurement invariance mentioned (check configural/metric/scalar).")
+    return comments
+
+def jingle_jangle(text, constructs_found, measures_found, ranges=None):
+    warns = []
+    ops = {m["measure"] for m in measures_found}
+    if "self-control" in constructs_found and "GritS" in ops:
+        warns.append("Jingle risk: paper labels ‘self-control’ but uses Grit-S (grit). Check boundaries.")
+    if "self-control" in constructs_found and "self-regulation" in constructs_found:
+        ranges = [(0, len(text))] if ranges is None else ranges
+        if not any(RE_BOUNDARY.search(text, s, e) for s, e in ranges):
+            warns.append("Jangle risk: both ‘self-control’ and ‘self-regulation’ are used with no explicit differentiation.")
+    if any(m["type"]=="self-report" for m in measures_found) and any(m["type"]=="behavioral task" for m in measures_found):
+        warns.append("Method mix: self-report and behavioral tasks both present — mapping to theory should be explicit.")
+    return warns
+
+# --- streaming analysis: consume pages as they are decoded
+class StreamingAnalysis:
+    # Finds section headings and runs the label detectors page by page, so early pages
+    # are analysed while later ones are still decoding. Pages are joined with "\n", so
+    # every page ends a line and the headings found per page are exactly those of
+    # section_spans() over the whole text. Numbers and sentence queries read the focus
+    # sections in FOCUS_SECS order rather than page order, so they run once in finish().
+    def __init__(self, kb=None):
+        self.kb = kb or default_index()
+        self.parts = []
+        self.size = 0
+        self.section = ("Full Text", 0)  # open section: name, start
+        self.sections = []               # closed sections: (name, start, end)
+        self.constructs = {}
+        self.measure_alias = {}  # measure -> index of the first alias seen so far
+        self.timings = Timings()
+
+    def _detect(self, chunk, ranges):
+        t = self.timings
+        with t.stage("detect_labels"):
+            found = self.kb.matcher.find(chunk, ranges)
+        with t.stage("detect_constructs"):
+            for key, lbls in self.kb.construct_hits(found).items():
+                self.constructs.setdefault(key, set()).update(lbls)
+        with t.stage("detect_measures"):
+            for meas, i in self.kb.best_aliases(found).items():
+                if i < self.measure_alias.get(meas, i + 1):
+                    self.measure_alias[meas] = i
+
+    def consume(self, pages):
+        # feed each page, timing how long it took to arrive (extraction); yields it once fed
+        pages = iter(pages)
+        while True:
+            t = time.perf_counter()
+            page = next(pages, None)
+            if page is None:
+                return
+            self.timings.page(page, time.perf_counter() - t)
+            self.feed(page)
+            yield page
+
+    def feed(self, page):
+        chunk = ("\n" if self.parts else "") + page.text
+        base = self.size
+        self.parts.append(chunk)
+        self.size += len(chunk)
+        with self.timings.stage("sectionize"):
+            name, start = self.section
+            ranges, pos = [], max(0, start - base)  # focus pieces of this chunk
+            for m in SECTION_HEAD.finditer(chunk):
+                if name in FOCUS_SECS and m.start() > pos:
+                    ranges.append((pos, m.start()))
+                if base + m.start() > start:
+                    self.sections.append((name, start, base + m.start()))
+                name, start, pos = section_name(m), base + m.start(), m.start()
+            if name in FOCUS_SECS and len(chunk) > pos:
+                ranges.append((pos, len(chunk)))
+            self.section = (name, start)
+        if ranges:
+            self._detect(chunk, ranges)
+
+    def finish(self):
+        # -> (text, focus ranges, constructs, measures)
+        text = "".join(self.parts)
+        name, start = self.section
+        sections = self.sections + [(name, start, len(text))]
+        constructs = {k: sorted(self.constructs[k]) for k in self.kb.constructs if k in self.constructs}
+        measures = [self.kb.measure_record(m, self.measure_alias[m]) for m in self.kb.measures if m in self.measure_alias]
+        return text, focus_spans(sections), constructs, measures
+
+    def report(self):
+        t = self.timings
+        text, focus, constructs, measures = self.finish()
+        with t.stage("extract_numbers"):
+            nums = extract_numbers(text, focus)
+            comments = threshold_comments(nums)
+        with t.stage("sentences"):
+            sents = SentenceTable(text, ranges=focus)
+        with t.stage("find_sents"):
+            for name, pat in SENT_PATTERNS.items():
+                sents.add(name, pat)
+            found = {name: sents.find(name, 6 if name == "validity" else 5) for name in SENT_PATTERNS}
+        with t.stage("component_map"):
+            comp_map = map_measures_to_components(measures)
+        with t.stage("jingle_jangle"):
+            warnings = jingle_jangle(text, constructs, measures, focus)
+        return {
+            "kb_version": self.kb.version,
+            "constructs_detected": constructs,
+            "measures_detected": measures,
+            "component_map": comp_map,
+            "definition_sents": found["definition"],
+            "boundary_sents": found["boundary"],
+            "theory_sents": found["theory"],
+            "design_sents": found["design"],
+            "validity_sents": found["validity"],
+            "numeric_indices": nums,
+            "numeric_comments": comments,
+            "warnings": warnings,
+            "timings": t.report()
+        }
+
+# --- pipeline entry points; each returns the "Raw / Export" report dict
+def analyze_pages(pages, kb=None):
+    stream = StreamingAnalysis(kb)
+    for _ in stream.consume(pages):
+        pass
+    return stream.report()
+
+def analyze_text(text, kb=None):
+    return analyze_pages([Page(1, text, None)], kb)
+
+def analyze_pdf(file, kb=None, **extract_opts):
+    stream = StreamingAnalysis(kb)
+    for _ in stream.consume(iter_pages(file, stats=stream.timings.extraction, **extract_opts)):
+        pass
+    return stream.report()
@@ -0,0 +1,146 @@
+import os
+import json
+import zlib
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+# Bump when extract.py changes what it produces for the same bytes.
+EXTRACTOR_VERSION = 4
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "construct-health", "extract")
+DEFAULT_MAX_MB = 512
+# Eviction goes down to this share of max_bytes, so a full cache isn't walked on every put.
+EVICT_TO = 0.9
+
+def _dist_version(name):
+    from importlib import metadata  # tens of ms; only needed once a cache is opened
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return "none"
+
+def engine_tag() -> str:
+    return f"x{EXTRACTOR_VERSION}-pymupdf{_dist_version('pymupdf')}-pypdf{_dist_version('pypdf')}"
+
+class ExtractionCache:
+    # Per-page text on local disk, keyed by sha256(pdf bytes) + engine versions.
+    # Entries are zlib-compressed JSON written atomically (tmp + rename); a hit bumps
+    # the file's mtime, and puts evict least-recently-used entries past max_bytes.
+    # Writers across processes serialize on an flock'd lock file, which also guards the
+    # running total size in .size, so only a put that crosses max_bytes walks the
+    # entries. Readers don't lock and treat an entry evicted under them as a miss.
+    def __init__(self, root=DEFAULT_DIR, max_bytes=DEFAULT_MAX_MB * 2**20):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, sha256, variant="") -> str:
+        return f"{sha256}-{engine_tag()}{'-' + variant if variant else ''}"
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ".json.z")
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.root, ".lock"), "a+") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                pages = json.loads(zlib.decompress(f.read()))
+            os.utime(path)
+        except (OSError, ValueError, zlib.error):
+            return None
+        return pages
+
+    def put(self, key, pages):
+        blob = zlib.compress(json.dumps(pages, ensure_ascii=False).encode("utf-8"), 6)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._locked():
+            total = self._total()
+            try:
+                total -= os.stat(path).st_size  # replacing an entry
+            except OSError:
+                pass
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(blob)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            total += len(blob)
+            if total > self.max_bytes:
+                total = self._evict()
+            self._set_total(total)
+
+    def _entries(self):
+        # -> [(mtime, size, path)] of every entry
+        entries = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(".json.z"):
+                    continue
+                p = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+        return entries
+
+    def _total(self):
+        # with the lock held; counted afresh when .size is missing or unreadable
+        try:
+            with open(os.path.join(self.root, ".size")) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return sum(size for _, size, _ in self._entries())
+
+    def _set_total(self, total):
+        with open(os.path.join(self.root, ".size"), "w") as f:
+            f.write(str(total))
+
+    def _evict(self):
+        # least recently used first, down to EVICT_TO of max_bytes; -> the new total
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.unlink(p)
+            except OSError:
+                pass
+            total -= size
+        return total
+
+_default = None
+
+def default_cache():
+    # CH_CACHE_DIR="" disables the cache; CH_CACHE_MAX_MB bounds its size
+    global _default
+    root = os.environ.get("CH_CACHE_DIR", DEFAULT_DIR)
+    if not root:
+        return None
+    if _default is None or _default.root != root:
+        try:
+            _default = ExtractionCache(root, int(os.environ.get("CH_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 2**20)
+        except OSError:
+            return None
+    return _default
@@ -0,0 +1,204 @@
+import os
+import sys
+import glob
+import json
+import argparse
+import tempfile
+
+from .extract import pool_context
+from .metrics import REGISTRY, FileFlusher
+
+# --- inputs: directories (searched recursively), globs, or files
+def expand_inputs(args):
+    paths = []
+    for arg in args:
+        if os.path.isdir(arg):
+            found = glob.glob(os.path.join(arg, "**", "*"), recursive=True)
+            paths += sorted(p for p in found if p.lower().endswith(".pdf") and os.path.isfile(p))
+        elif glob.has_magic(arg):
+            paths += sorted(p for p in glob.glob(arg, recursive=True) if os.path.isfile(p))
+        else:
+            paths.append(arg)
+    return list(dict.fromkeys(paths))  # drop duplicates, keep order
+
+# --- per-document work, run in the pool
+_OPTS = {}
+
+def _init_worker(opts):
+    from .kb import warm
+    _OPTS.update(opts)
+    warm()
+
+def _run(path, profile_base=None):
+    from .analysis import analyze_pdf
+    try:
+        # one document per worker; page-level pools would oversubscribe the CPUs
+        if not profile_base:
+            return {"file": path, **analyze_pdf(path, workers=1, **_OPTS)}
+        from .profiling import profile_call, write_profile
+        report, stats = profile_call(analyze_pdf, path, workers=1, **_OPTS)
+        return {"file": path, **report, "profile": write_profile(stats, profile_base)}
+    except Exception as e:
+        return {"file": path, "error": f"{type(e).__name__}: {e}"}
+
+def analyze_many(paths, workers=None, profile_bases=None, **opts):
+    # {"file": ..., **report} (or {"file": ..., "error": ...}) per document, in input order;
+    # each one is also counted in metrics.REGISTRY.
+    # profile_bases: per document, None or a path prefix for its .pstats/.collapsed profile
+    workers = workers or os.cpu_count() or 1
+    bases = profile_bases or [None] * len(paths)
+    if workers == 1:
+        _init_worker(opts)
+        recs = map(_run, paths, bases)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        ex = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(),
+                                 initializer=_init_worker, initargs=(opts,))
+        recs = ex.map(_run, paths, bases)
+    try:
+        for rec in recs:
+            REGISTRY.record_report(rec)
+            yield rec
+    finally:
+        if workers > 1:
+            ex.shutdown(cancel_futures=True)
+
+# --- outputs
+def write_json(path, rec):
+    # atomically, so an interrupted run never leaves a truncated report
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(rec, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+def _profile_bases(paths, profile_dir):
+    # <profile_dir>/<pdf name>, numbered when two inputs share a name
+    bases, seen = [], {}
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        bases.append(os.path.join(profile_dir, stem if seen[stem] == 1 else f"{stem}-{seen[stem]}"))
+    return bases
+
+def run_jsonl(paths, out, workers=None, profile_dir=None, **opts):
+    # profile_dir: profile every document, writing <name>.pstats/.collapsed there
+    # -> number of failed documents
+    failed = 0
+    bases = _profile_bases(paths, profile_dir) if profile_dir else None
+    for rec in analyze_many(paths, workers, bases, **opts):
+        failed += "error" in rec
+        out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        out.flush()
+    return failed
+
+def run_incremental(paths, out_dir, manifest_path=None, workers=None, force=False, profile=False, **opts):
+    # One <sha256>.json per document under out_dir; documents whose content, KB and
+    # pipeline version are unchanged since the last run are skipped. profile: also write
+    # <sha256>.pstats/.collapsed for each analysed document.
+    # -> (analysed, skipped, failed)
+    from .analysis import PIPELINE_VERSION
+    from .kb import kb_hashes
+    from .manifest import Manifest, options_key
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = Manifest(manifest_path or os.path.join(out_dir, "manifest.sqlite"))
+    kb, options = kb_hashes(), options_key(opts)
+    try:
+        todo, meta, done, skipped, failed = [], {}, 0, 0, 0
+        for path in paths:
+            try:
+                fresh, sha, st = manifest.check(path, kb, PIPELINE_VERSION, options)
+            except OSError as e:  # gone or unreadable: nothing to record it under
+                failed += 1
+                print(f"{path}: {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+            if force or not fresh:
+                todo.append(path)
+                meta[path] = (sha, st)
+            else:
+                skipped += 1
+        bases = [os.path.join(out_dir, meta[p][0]) for p in todo] if profile else None
+        for rec in analyze_many(todo, workers, bases, **opts):
+            sha, st = meta[rec["file"]]
+            output = None
+            if "error" in rec:
+                failed += 1
+                print(f"{rec['file']}: {rec['error']}", file=sys.stderr)
+            else:
+                output = os.path.join(out_dir, sha + ".json")
+                write_json(output, rec)
+                done += 1
+            manifest.record(rec["file"], st, sha, kb, PIPELINE_VERSION, output, options)
+        return done, skipped, failed
+    finally:
+        manifest.close()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m construct_health",
+                                 description="Run the construct-health analysis over PDFs; one JSON report per document.")
+    ap.add_argument("inputs", nargs="+", help="PDF files, directories (searched recursively) or glob patterns")
+    ap.add_argument("-o", "--output", help="JSON Lines file to write (default: stdout)")
+    ap.add_argument("-d", "--out-dir", help="write <sha256>.json per document and skip documents already "
+                                             "processed with the same content, KB and pipeline version")
+    ap.add_argument("--manifest", help="manifest database for --out-dir (default: OUT_DIR/manifest.sqlite)")
+    ap.add_argument("--force", action="store_true", help="with --out-dir, reprocess every document")
+    ap.add_argument("-w", "--workers", type=int, help="documents analysed in parallel (default: CPU count)")
+    ap.add_argument("--back-matter", action="store_true", help="keep references, appendices and supplementary pages")
+    ap.add_argument("--no-cache", action="store_true", help="bypass the on-disk extraction cache")
+    ap.add_argument("--profile", action="store_true", help="profile each document with cProfile; writes "
+                                                          "<name>.pstats and <name>.collapsed next to its JSON")
+    ap.add_argument("--pipeline", action="store_true", help="with --out-dir, overlap reading, extraction, analysis "
+                                                           "and writing (asyncio, bounded queues between stages)")
+    ap.add_argument("--limit", action="append", default=[], metavar="STAGE=N",
+                    help="with --pipeline, tasks for a stage (read, extract, analyze, write); repeatable")
+    ap.add_argument("--queue", type=int, help="with --pipeline, documents queued between stages (default: workers)")
+    ap.add_argument("--metrics-file", help="keep Prometheus-format metrics in this file, rewritten every "
+                                           "--metrics-interval seconds and at the end")
+    ap.add_argument("--metrics-interval", type=float, default=15, help="seconds between metrics file writes")
+    args = ap.parse_args(argv)
+
+    if args.output and args.out_dir:
+        ap.error("use either --output or --out-dir")
+    if (args.manifest or args.force or args.pipeline) and not args.out_dir:
+        ap.error("--manifest, --force and --pipeline need --out-dir")
+    if (args.limit or args.queue) and not args.pipeline:
+        ap.error("--limit and --queue need --pipeline")
+    if args.pipeline and args.profile:
+        ap.error("--profile is not supported with --pipeline")
+    limits = {}
+    for spec in args.limit:
+        stage, _, n = spec.partition("=")
+        if stage not in ("read", "extract", "analyze", "write") or not n.isdigit() or int(n) < 1:
+            ap.error(f"bad --limit {spec!r}: expected read|extract|analyze|write=N")
+        limits[stage] = int(n)
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        ap.error("no PDF files found")
+    opts = {"back_matter": args.back_matter}
+    if args.no_cache:
+        opts["cache"] = False
+
+    flusher = FileFlusher(args.metrics_file, args.metrics_interval) if args.metrics_file else None
+    try:
+        if args.out_dir:
+            if args.pipeline:
+                from .pipeline import run_pipeline
+                done, skipped, failed = run_pipeline(paths, args.out_dir, args.manifest, args.workers, limits,
+                                                     args.queue, args.force, **opts)
+            else:
+                done, skipped, failed = run_incremental(paths, args.out_dir, args.manifest, args.workers, args.force,
+                                                        args.profile, **opts)
+            print(f"{done} analysed, {skipped} up to date, {failed} failed", file=sys.stderr)
+            return 1 if failed else 0
+        out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            profile_dir = (os.path.dirname(os.path.abspath(args.output)) if args.output else os.getcwd()) \
+                if args.profile else None
+            failed = run_jsonl(paths, out, args.workers, profile_dir, **opts)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        print(f"{len(paths) - failed}/{len(paths)} documents analysed", file=sys.stderr)
+        return 1 if failed else 0
+    finally:
+        if flusher:
+            flusher.stop()
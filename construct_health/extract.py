@@ -0,0 +1,325 @@
+import os
+import logging
+import hashlib
+import tempfile
+import regex as re
+from collections import namedtuple
+from contextlib import closing
+
+from .cache import default_cache
+
+log = logging.getLogger(__name__)
+
+# Documents shorter than this are extracted serially; pool start-up costs more than it saves.
+PARALLEL_MIN_PAGES = int(os.environ.get("CH_PARALLEL_MIN_PAGES", "40"))
+
+# Uploads larger than this are spooled to a temp file and opened by path.
+SPOOL_BYTES = int(os.environ.get("CH_SPOOL_MB", "16")) * 2**20
+
+# --- back matter: a line that is nothing but a References/Bibliography/Appendix heading.
+# Only looked for past BACK_MATTER_MIN_FRACTION of the pages, so a table of contents
+# or an early "Appendix" cross-reference doesn't end the document, and only trailing
+# back matter is dropped: in an edited volume every chapter ends with its own
+# References, and a chapter heading after one means the body goes on. Section
+# headings don't count, as appendices have their own Method or Measures. Past
+# BACK_MATTER_MAX_PAGES pages without a chapter heading the rest is back matter too,
+# and is never decoded.
+BACK_MATTER = re.compile(r'^[ \t]*(?:\d+(?:\.\d+)*\.?[ \t]+)?(?:References|Bibliography|Works Cited|Literature Cited'
+                         r'|Appendix(?:[ \t]+[A-Z0-9]{1,3})?|Appendices|Supplementary (?:Materials?|Information)'
+                         r'|Supporting Information)[ \t]*:?[ \t]*$', re.I | re.M)
+BACK_MATTER_MIN_FRACTION = 0.5
+CHAPTER_HEAD = re.compile(r'^[ \t]*Chapter[ \t]+(?:\d+|[IVXLC]+)\b', re.I | re.M)
+BACK_MATTER_MAX_PAGES = int(os.environ.get("CH_BACK_MATTER_MAX_PAGES", "10"))
+
+# number is 1-based, as printed in PDF viewers; engine is "pymupdf", "pypdf",
+# or None for a page neither engine got text from
+Page = namedtuple("Page", "number text engine")
+
+def default_workers() -> int:
+    env = os.environ.get("CH_EXTRACT_WORKERS")
+    if env:
+        return max(1, int(env))
+    return os.cpu_count() or 1
+
+# Imported once by the forkserver, so pool workers are forked with the analysis core
+# already loaded. "__main__" stays: without it every worker re-imports the main script
+# itself (under Streamlit, the streamlit launcher and all of Streamlit).
+FORKSERVER_PRELOAD = ["__main__", "construct_health.analysis"]
+
+def pool_context():
+    # forkserver/spawn: forking a multi-threaded Streamlit server is not safe.
+    # multiprocessing is imported here so that importing the library doesn't pay for it.
+    import multiprocessing as mp
+    if "forkserver" not in mp.get_all_start_methods():
+        return mp.get_context("spawn")
+    ctx = mp.get_context("forkserver")
+    ctx.set_forkserver_preload(FORKSERVER_PRELOAD)  # no effect once the forkserver runs
+    return ctx
+
+def spool(data, prefix="ch-"):
+    # -> path of a temp file holding data (a PDF's bytes), for pool workers to open;
+    # documents go to workers by path, never pickled. The caller deletes it.
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
+
+# --- input: a path, or an in-memory upload borrowed without copying
+class _Source:
+    # target is what the engines open: a filesystem path, or the caller's BytesIO whose
+    # buffer is handed to PyMuPDF as a memoryview. (getvalue(), not getbuffer(): a BytesIO
+    # built from bytes, like Streamlit's UploadedFile, returns that same object, while
+    # getbuffer() forces a private copy.) Large uploads and arbitrary streams
+    # are spooled to a temp file, which pool workers also open by path.
+    def __init__(self, file):
+        self._tmp = None
+        h = hashlib.sha256()
+        if isinstance(file, (str, os.PathLike)):
+            self.target = os.fspath(file)
+            with open(self.target, "rb") as f:
+                while chunk := f.read(2**20):
+                    h.update(chunk)
+        elif hasattr(file, "getvalue"):
+            with memoryview(file.getvalue()) as view:
+                h.update(view)
+                if len(view) > SPOOL_BYTES:
+                    self.target = self._spool([view])
+                else:
+                    self.target = file
+        else:
+            def chunks():
+                while chunk := file.read(2**20):
+                    h.update(chunk)
+                    yield chunk
+            self.target = self._spool(chunks())
+        self.sha256 = h.hexdigest()
+
+    def _spool(self, chunks):
+        fd, self._tmp = tempfile.mkstemp(prefix="ch-", suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        return self._tmp
+
+    def path(self) -> str:
+        if not isinstance(self.target, str):
+            with memoryview(self.target.getvalue()) as view:
+                self.target = self._spool([view])
+        return self.target
+
+    def close(self):
+        if self._tmp:
+            try:
+                os.unlink(self._tmp)
+            except OSError:
+                pass
+            self._tmp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# --- engines
+def _open_fitz(target):
+    import fitz  # PyMuPDF
+    if isinstance(target, str):
+        return fitz.open(target, filetype="pdf")
+    return fitz.open(stream=memoryview(target.getvalue()), filetype="pdf")
+
+def _fitz_page(doc, i):
+    import fitz
+    page = doc[i]
+    text = page.get_text("text")
+    # MuPDF keeps every decoded image stream in its store (up to 256 MB) although text
+    # extraction never reuses them; on scanned PDFs that store is the peak RSS. Emptying
+    # it also evicts the fonts the next page re-parses, so only after pages with images.
+    if page.get_images():
+        fitz.TOOLS.store_shrink(100)
+    return text
+
+def _open_pypdf(target):
+    from pypdf import PdfReader
+    # pypdf slurps a path into a BytesIO; an open handle is read lazily instead
+    if isinstance(target, str):
+        return PdfReader(open(target, "rb"))
+    target.seek(0)
+    return PdfReader(target)
+
+# Prefer PyMuPDF for cleaner text; fall back to pypdf
+class _Reader:
+    # Engine choice per page: PyMuPDF for every page it can read, pypdf (opened on
+    # first need) only for pages where PyMuPDF raises or finds no text.
+    def __init__(self, target):
+        self.target = target
+        self._pypdf = None
+        try:
+            self.fitz = _open_fitz(target)
+        except Exception:
+            self.fitz = None
+        self.page_count = self.fitz.page_count if self.fitz is not None else len(self.pypdf().pages)
+
+    def pypdf(self):
+        if self._pypdf is None:
+            try:
+                self._pypdf = _open_pypdf(self.target)
+            except Exception:
+                if self.fitz is None:
+                    raise  # neither engine can open it
+                self._pypdf = False
+        return self._pypdf
+
+    def page(self, i):
+        # -> (text, engine); engine is None when neither engine got any text
+        if self.fitz is not None:
+            try:
+                text = _fitz_page(self.fitz, i)
+                if text.strip():
+                    return text, "pymupdf"
+            except Exception as e:
+                log.debug("pymupdf failed on page %d: %s", i + 1, e)
+        if self.pypdf():
+            try:
+                text = self._pypdf.pages[i].extract_text() or ""
+                if text.strip():
+                    return text, "pypdf"
+            except Exception as e:
+                log.warning("no text for page %d: %s", i + 1, e)
+        return "", None
+
+    def outline_back_matter(self, first):
+        # 0-based page where the trailing back matter starts, at or after page index
+        # `first`: the first of the back-matter bookmarks that end the top level of the
+        # outline. None when the outline ends with a chapter or section.
+        if self.fitz is None:
+            return None
+        try:
+            toc = self.fitz.get_toc(simple=True)
+        except Exception:
+            return None
+        start = None
+        for level, title, p in toc:
+            if level != 1:
+                continue
+            if not BACK_MATTER.search(title.strip()):
+                start = None
+            elif start is None and p - 1 >= first:
+                start = p - 1
+        return start
+
+    def close(self):
+        if self.fitz is not None:
+            self.fitz.close()
+        if self._pypdf and isinstance(self.target, str):
+            self._pypdf.stream.close()  # our handle from _open_pypdf
+
+# --- per-worker state: one open reader per process
+_READER = None
+
+def _init_worker(path):
+    global _READER
+    _READER = _Reader(path)
+
+def _pool_pages(start, stop):
+    return [_READER.page(i) for i in range(start, stop)]
+
+def _chunks(n, workers):
+    # a few chunks per worker so one slow (image-heavy) range doesn't stall the pool
+    size = max(1, -(-n // (workers * 4)))
+    return [(s, min(s + size, n)) for s in range(0, n, size)]
+
+def _use_pool(n, workers):
+    return workers > 1 and n >= PARALLEL_MIN_PAGES
+
+def _decode(src, reader, workers, n=None):
+    # pages [0, n) in order; n defaults to the whole document
+    n, done = reader.page_count if n is None else n, 0
+    if _use_pool(n, workers):
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+        chunks = _chunks(n, workers)
+        # workers open the file themselves; nothing PDF-sized is pickled to them
+        ex = ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=pool_context(),
+                                 initializer=_init_worker, initargs=(src.path(),))
+        try:
+            # map() hands back chunks in order as soon as each one is ready
+            for part in ex.map(_pool_pages, *zip(*chunks)):
+                for text, engine in part:
+                    done += 1
+                    yield Page(done, text, engine)
+            return
+        except (BrokenProcessPool, OSError):
+            pass  # no usable pool (sandboxed host, worker crash): finish serially
+        finally:
+            ex.shutdown(wait=False, cancel_futures=True)
+    for i in range(done, n):
+        yield Page(i + 1, *reader.page(i))
+
+def _resumes(text):
+    # -> end of the last chapter heading in text, or None
+    ends = [m.end() for m in CHAPTER_HEAD.finditer(text)]
+    return ends[-1] if ends else None
+
+def _body(src, reader, workers):
+    # Drop the trailing back matter: the outline says where it starts when the PDF has
+    # one, so the pages after it are never decoded. Pages from a back-matter heading on
+    # are held back until a chapter heading shows the body goes on (they are passed on)
+    # or the document ends or BACK_MATTER_MAX_PAGES pages go by without one (they are
+    # dropped, and nothing further is decoded).
+    first = int(reader.page_count * BACK_MATTER_MIN_FRACTION)
+    marked = reader.outline_back_matter(first)
+    held, cut = [], 0  # held[0] is the page with the heading, at offset cut
+    with closing(_decode(src, reader, workers, None if marked is None else marked + 1)) as pages:
+        for page in pages:
+            if page.number <= first:
+                yield page
+                continue
+            resume = _resumes(page.text)
+            if held and resume is not None:
+                yield from held
+                held = []
+            if held:
+                if len(held) >= BACK_MATTER_MAX_PAGES:
+                    break
+                held.append(page)
+                continue
+            m = BACK_MATTER.search(page.text, resume or 0)
+            if m:
+                held, cut = [page], m.start()
+            else:
+                yield page
+    if held and held[0].text[:cut].strip():
+        yield held[0]._replace(text=held[0].text[:cut])
+
+def iter_pages(file, workers=None, cache=None, back_matter=False, stats=None):
+    # file: a path, a BytesIO (e.g. a Streamlit upload) or any binary stream.
+    # cache: an ExtractionCache, None for the process default, False to bypass
+    # back_matter: keep references, appendices and supplements (skipped by default)
+    # stats: a dict that gets "cache": "hit" or "miss" when a cache is in use
+    workers = default_workers() if workers is None else max(1, workers)
+    if cache is None:
+        cache = default_cache()
+    with _Source(file) as src:
+        key = cache.key(src.sha256, "" if back_matter else "body") if cache else None
+        if key:
+            hit = cache.get(key)
+            if stats is not None:
+                stats["cache"] = "miss" if hit is None else "hit"
+            if hit is not None:
+                for row in hit:
+                    yield Page(*row)
+                return
+        pages = []
+        with closing(_Reader(src.target)) as reader:
+            for page in (_decode if back_matter else _body)(src, reader, workers):
+                pages.append(page)
+                yield page
+    if key:
+        try:
+            cache.put(key, pages)
+        except OSError:
+            pass  # a full or read-only cache dir must not fail the analysis
+
+def extract_text(file, workers=None, cache=None, back_matter=False) -> str:
+    return "\n".join(p.text for p in iter_pages(file, workers, cache, back_matter))
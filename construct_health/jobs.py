@@ -0,0 +1,183 @@
+import os
+import time
+import itertools
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .extract import pool_context, spool
+from .metrics import REGISTRY
+
+# Analyses running at once across the whole server; further submissions wait their turn.
+# One core is left for the web server itself.
+MAX_JOBS = int(os.environ.get("CH_JOB_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+class Job:
+    # One submitted document. The queue's threads write the fields; the UI only reads them.
+    def __init__(self, id, name, key):
+        self.id = id
+        self.name = name
+        self.key = key
+        self.status = "queued"   # queued -> running -> done | failed
+        self.page = 0            # pages analysed so far
+        self.constructs = []     # constructs detected so far
+        self.result = None       # the report dict, once done
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+# --- worker side
+_PROGRESS = None
+
+def _init_worker(progress):
+    global _PROGRESS
+    from .kb import warm
+    _PROGRESS = progress
+    warm()
+
+def _analyse(job_id, path, back_matter):
+    from .analysis import StreamingAnalysis
+    from .extract import iter_pages
+    _PROGRESS.put((job_id, 0, []))
+    stream = StreamingAnalysis()
+    # one core per job, without a page pool: the queue already runs jobs side by side
+    pages = iter_pages(path, workers=1, back_matter=back_matter, stats=stream.timings.extraction)
+    for page in stream.consume(pages):
+        _PROGRESS.put((job_id, page.number, list(stream.constructs)))
+    return stream.report()
+
+def _run_job(job_id, path, back_matter, profile_base=None):
+    if not profile_base:
+        return _analyse(job_id, path, back_matter)
+    from .profiling import profile_call, write_profile
+    report, stats = profile_call(_analyse, job_id, path, back_matter)
+    return {**report, "profile": write_profile(stats, profile_base)}
+
+def _unlink(path):
+    if path:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+# --- queue
+class JobQueue:
+    # Runs analyses in one process pool shared by every session, so no session's script
+    # thread does the work and at most `workers` documents are analysed at once. Workers
+    # send per-page progress over a multiprocessing queue; a collector thread applies it
+    # to the Job, and the UI polls. Jobs are deduplicated by key (content hash, KB
+    # version, options); finished ones are kept `ttl` seconds, at most `keep` of them.
+    # Queue depth, analyses in progress and finished reports go to `metrics`.
+    def __init__(self, workers=MAX_JOBS, keep=32, ttl=3600, metrics=REGISTRY):
+        self.workers = workers
+        self.metrics = metrics
+        self.keep = keep
+        self.ttl = ttl
+        self._ctx = pool_context()
+        self._progress = self._ctx.Queue()
+        self._pool = self._new_pool()
+        self._jobs = {}   # key -> Job, in submission order
+        self._by_id = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        threading.Thread(target=self._collect, name="job-progress", daemon=True).start()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=self._ctx,
+                                   initializer=_init_worker, initargs=(self._progress,))
+
+    def submit(self, data, name, key, back_matter=False, profile=False):
+        # data: the PDF's bytes. -> Job; the existing one if key was submitted before,
+        # failed or not (see retry()). profile: run under cProfile, writing the profile to
+        # profiling.PROFILE_DIR and adding a "profile" block to the report
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(key)
+            if job is not None:
+                return job
+            job = Job(next(self._ids), name, key)
+            self._jobs[key] = job
+            self._by_id[job.id] = job
+            self._gauges()
+        path = None
+        try:
+            path = spool(data, "ch-job-")
+            profile_base = None
+            if profile:
+                from .profiling import PROFILE_DIR
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                stem = os.path.splitext(os.path.basename(name))[0]
+                profile_base = os.path.join(PROFILE_DIR, f"{stem}-{int(job.submitted)}-{job.id}")
+            try:
+                fut = self._pool.submit(_run_job, job.id, path, back_matter, profile_base)
+            except BrokenProcessPool:
+                # a worker died (out of memory, crash): jobs in flight failed, start a fresh pool
+                self._pool = self._new_pool()
+                fut = self._pool.submit(_run_job, job.id, path, back_matter, profile_base)
+        except Exception as e:
+            # never started: fail the job now rather than leave it queued for good
+            _unlink(path)
+            self._settle(job, None, f"{type(e).__name__}: {e}")
+            return job
+        fut.add_done_callback(lambda f: self._finish(job, f, path))
+        return job
+
+    def get(self, job_id):
+        return self._by_id.get(job_id)
+
+    def retry(self, key):
+        # forget key's job if it failed, so the next submit() of key runs it again
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status == "failed":
+                del self._jobs[key]
+                del self._by_id[job.id]
+
+    def _finish(self, job, fut, path):
+        _unlink(path)
+        try:
+            result, error = fut.result(), None
+        except Exception as e:
+            result, error = None, f"{type(e).__name__}: {e}"
+        self._settle(job, result, error)
+
+    def _settle(self, job, result, error):
+        # under the lock, so a late progress message can't turn a finished job back to running
+        with self._lock:
+            job.finished = time.time()  # before status: _prune() reads it for any done job
+            job.result, job.error = result, error
+            job.status = "failed" if error else "done"
+            self._gauges()
+        self.metrics.record_report(result if not error else {"error": error})
+
+    def _collect(self):
+        while True:
+            job_id, page, constructs = self._progress.get()
+            with self._lock:
+                job = self._by_id.get(job_id)
+                if job is not None and not job.done:
+                    job.status, job.page, job.constructs = "running", page, constructs
+                    if page == 0:
+                        self._gauges()
+
+    def _gauges(self):
+        # with self._lock held
+        status = [j.status for j in self._jobs.values()]
+        self.metrics.set("ch_jobs_queued", status.count("queued"))
+        self.metrics.set("ch_analyses_in_progress", status.count("running"))
+
+    def _prune(self):
+        # drop expired finished jobs, then the oldest finished ones beyond `keep`
+        now = time.time()
+        finished = [j for j in self._jobs.values() if j.done]
+        expired = [j for j in finished if now - j.finished > self.ttl]
+        for job in expired + [j for j in finished if j not in expired][:-self.keep or None]:
+            del self._jobs[job.key]
+            del self._by_id[job.id]
+
+    def shutdown(self):
+        self._pool.shutdown(cancel_futures=True)
@@ -0,0 +1,168 @@
+import os
+import time
+import logging
+import hashlib
+from threading import Lock, Thread
+
+from .matching import LabelMatcher
+
+log = logging.getLogger(__name__)
+
+# KB YAML files live at the repository root unless CH_KB_DIR points elsewhere
+KB_DIR = os.environ.get("CH_KB_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+KB_FILES = ("kb_constructs.yaml", "kb_measures.yaml")
+
+# How often (seconds) default_index() looks for edited KB files; 0 never reloads
+RELOAD_SECS = float(os.environ.get("CH_KB_RELOAD_SECS", "2"))
+
+# --- KB loaders
+def _read(kb_dir):
+    out = []
+    for name in KB_FILES:
+        with open(os.path.join(kb_dir, name), "rb") as f:
+            out.append(f.read())
+    return out
+
+def load_kb(kb_dir=None):
+    import yaml
+    return tuple(yaml.safe_load(raw.decode("utf-8")) for raw in _read(kb_dir or KB_DIR))
+
+def kb_hashes(kb_dir=None):
+    # sha256 of (kb_constructs.yaml, kb_measures.yaml)
+    return tuple(hashlib.sha256(raw).hexdigest() for raw in _read(kb_dir or KB_DIR))
+
+# --- compiled index
+class KBIndex:
+    # Everything the detectors need from one version of the KB, compiled once:
+    # deduplicated label/alias tables, a single LabelMatcher over all of them (labels are
+    # matched on their casefolded form), and reverse maps from a matched label to the
+    # constructs and measures it belongs to.
+    def __init__(self, kb_c, kb_m, file_hashes=None):
+        self.raw = (kb_c, kb_m)
+        self.file_hashes = file_hashes
+        self.version = hashlib.sha256("".join(file_hashes).encode()).hexdigest()[:12] if file_hashes else None
+        self.constructs = {}       # construct -> labels (canonical, then near neighbours)
+        self.label_constructs = {}
+        for key, node in kb_c["constructs"].items():
+            labels = list(dict.fromkeys(node.get("canonical_labels", []) + node.get("near_neighbors", [])))
+            self.constructs[key] = labels
+            for lbl in labels:
+                self.label_constructs.setdefault(lbl, []).append(key)
+        self.measures = {}         # measure -> {"aliases", "type", "targets"}
+        self.alias_measures = {}   # alias -> [(measure, position in its alias list)]
+        for meas, node in kb_m["measures"].items():
+            aliases = list(dict.fromkeys(node["aliases"]))
+            self.measures[meas] = {"aliases": aliases, "type": node["type"], "targets": node["targets"]}
+            for i, alias in enumerate(aliases):
+                self.alias_measures.setdefault(alias, []).append((meas, i))
+        self.matcher = LabelMatcher(list(self.label_constructs) + list(self.alias_measures))
+
+    def construct_hits(self, found):
+        # matched labels -> {construct: set(labels)}
+        hits = {}
+        for lbl in found:
+            for key in self.label_constructs.get(lbl, ()):
+                hits.setdefault(key, set()).add(lbl)
+        return hits
+
+    def best_aliases(self, found):
+        # matched aliases -> {measure: index of its first listed alias that matched}
+        best = {}
+        for alias in found:
+            for meas, i in self.alias_measures.get(alias, ()):
+                if i < best.get(meas, len(self.measures[meas]["aliases"])):
+                    best[meas] = i
+        return best
+
+    def measure_record(self, meas, i):
+        node = self.measures[meas]
+        return {"measure": meas, "alias": node["aliases"][i], "type": node["type"], "targets": node["targets"]}
+
+# Process-wide: every Streamlit session, thread and batch job in a process shares the
+# index for a KB version instead of rebuilding (or deep-copying) it.
+_INDEXES = {}
+_INDEXES_KEPT = 4  # a few recent versions; hot reloads would otherwise accumulate them
+_lock = Lock()
+
+def get_index(kb_dir=None):
+    import yaml
+    raws = _read(kb_dir or KB_DIR)
+    hashes = tuple(hashlib.sha256(raw).hexdigest() for raw in raws)
+    with _lock:
+        if hashes not in _INDEXES:
+            kb_c, kb_m = (yaml.safe_load(raw.decode("utf-8")) for raw in raws)
+            _INDEXES[hashes] = KBIndex(kb_c, kb_m, hashes)
+            while len(_INDEXES) > _INDEXES_KEPT:
+                del _INDEXES[next(iter(_INDEXES))]
+        return _INDEXES[hashes]
+
+# --- hot reload
+class KBWatcher:
+    # The active KBIndex for a KB directory, kept current without restarts. current()
+    # stats the KB files at most every `interval` seconds; when a size or mtime changed
+    # it compiles the new version on a background thread and swaps it in with one
+    # assignment, so callers always get a complete index (the old one until the new
+    # one is ready). An edit that fails to load (half-saved YAML) keeps the old index
+    # and is retried on the next change.
+    def __init__(self, kb_dir=None, interval=RELOAD_SECS):
+        self.kb_dir = kb_dir or KB_DIR
+        self.interval = interval
+        self._stamp = self._stat()
+        self.index = get_index(self.kb_dir)
+        self._checked = time.monotonic()
+        self._building = False
+        self._lock = Lock()
+
+    def _stat(self):
+        stamp = []
+        for name in KB_FILES:
+            try:
+                st = os.stat(os.path.join(self.kb_dir, name))
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def current(self):
+        if self.interval and time.monotonic() - self._checked >= self.interval:
+            self.check()
+        return self.index
+
+    def check(self):
+        # start a rebuild if the files changed since the last one; returns immediately
+        self._checked = time.monotonic()
+        stamp = self._stat()
+        with self._lock:
+            if stamp == self._stamp or self._building:
+                return
+            self._building = True
+        Thread(target=self._rebuild, args=(stamp,), name="kb-reload", daemon=True).start()
+
+    def _rebuild(self, stamp):
+        try:
+            index = get_index(self.kb_dir)
+            if index is not self.index:
+                log.info("KB reloaded: version %s -> %s", self.index.version, index.version)
+            self.index = index
+        except Exception as e:
+            log.warning("KB reload failed, keeping version %s: %s", self.index.version, e)
+        finally:
+            with self._lock:
+                self._stamp = stamp
+                self._building = False
+
+_watcher = None
+_watcher_lock = Lock()
+
+def default_index():
+    # the current index of KB_DIR, reloaded in the background when its files change
+    global _watcher
+    if _watcher is None:
+        with _watcher_lock:
+            if _watcher is None:
+                _watcher = KBWatcher()
+    return _watcher.current()
+
+def warm():
+    # process pool initializer: compile the KB once per worker process, not per document
+    default_index()
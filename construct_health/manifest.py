@@ -0,0 +1,75 @@
+import os
+import json
+import sqlite3
+import hashlib
+from datetime import datetime, timezone
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    path             TEXT PRIMARY KEY,
+    size             INTEGER NOT NULL,
+    mtime_ns         INTEGER NOT NULL,
+    sha256           TEXT NOT NULL,
+    kb_constructs    TEXT NOT NULL,
+    kb_measures      TEXT NOT NULL,
+    pipeline_version INTEGER NOT NULL,
+    status           TEXT NOT NULL,  -- "ok" or "error"
+    output           TEXT,           -- report location; NULL after an error
+    processed_at     TEXT NOT NULL,
+    options          TEXT NOT NULL DEFAULT ''  -- options_key() of the run
+)
+"""
+
+# Analysis options that change the report (the extraction cache, say, doesn't): a
+# document last analysed with other values is out of date.
+REPORT_OPTIONS = {"back_matter": False}
+
+def options_key(opts) -> str:
+    return json.dumps({k: opts.get(k, default) for k, default in REPORT_OPTIONS.items()}, sort_keys=True)
+
+def sha256_file(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(2**20):
+            h.update(chunk)
+    return h.hexdigest()
+
+class Manifest:
+    # Which documents a corpus run has already processed, and against which inputs.
+    # A document is up to date when its content hash, both KB file hashes and the
+    # pipeline version match the last successful run and the output still exists.
+    # The stored size/mtime only let an unchanged file skip re-hashing.
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(SCHEMA)
+        if "options" not in [c[1] for c in self.db.execute("PRAGMA table_info(documents)")]:
+            # manifests from before options were recorded: their rows match no options, so they rerun
+            self.db.execute("ALTER TABLE documents ADD COLUMN options TEXT NOT NULL DEFAULT ''")
+        self.db.commit()
+
+    def check(self, path, kb_hashes, pipeline_version, options=""):
+        # options: options_key() of this run. -> (up_to_date, sha256, stat)
+        st = os.stat(path)
+        row = self.db.execute(
+            "SELECT size, mtime_ns, sha256, kb_constructs, kb_measures, pipeline_version, status, output, options"
+            " FROM documents WHERE path = ?", (path,)).fetchone()
+        if row and (row[0], row[1]) == (st.st_size, st.st_mtime_ns):
+            sha = row[2]
+        else:
+            sha = sha256_file(path)
+        fresh = (row is not None and row[2] == sha and (row[3], row[4]) == tuple(kb_hashes)
+                 and row[5] == pipeline_version and row[6] == "ok" and row[8] == options
+                 and row[7] is not None and os.path.exists(row[7]))
+        return fresh, sha, st
+
+    def record(self, path, st, sha, kb_hashes, pipeline_version, output=None, options=""):
+        self.db.execute(
+            "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, st.st_size, st.st_mtime_ns, sha, kb_hashes[0], kb_hashes[1], pipeline_version,
+             "ok" if output else "error", output, datetime.now(timezone.utc).isoformat(timespec="seconds"),
+             options))
+        self.db.commit()  # per document, so an interrupted run resumes where it stopped
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,49 @@
+import os
+import regex as re
+
+WORD = re.compile(r'\w+')
+
+# Up to this many distinct labels, searching each one's pattern directly is cheaper than
+# building the vocabulary even when no label occurs (benchmarks' sparse_text(), 1.2 MB:
+# the vocabulary costs ~20 ms, each absent label's search ~1.2 ms; a present one's
+# search stops early). The KB's own label set is well past it.
+DIRECT_MAX = int(os.environ.get("CH_MATCHER_DIRECT_MAX", "16"))
+
+def vocabulary(text) -> set:
+    # distinct casefolded \w+ words of text; \w runs never cross whitespace, so splitting
+    # the (few) distinct whitespace-separated tokens avoids materialising every word
+    vocab = set()
+    for tok in set(text.casefold().split()):
+        vocab.update(WORD.findall(tok))
+    return vocab
+
+class LabelMatcher:
+    # Which of many labels occur in a text, with the semantics of
+    # re.search(rf'\b{re.escape(lbl)}\b', text, re.I) for each one. One scan collects
+    # the text's vocabulary; a label can only match if every word in it is in that
+    # vocabulary, so most labels are ruled out by set lookups and only the remaining
+    # candidates are confirmed with their own pattern. Label sets of up to
+    # direct_max skip the vocabulary and search every pattern. Labels that differ only
+    # in case share one pattern.
+    def __init__(self, labels, direct_max=DIRECT_MAX):
+        self.keys = {}   # casefolded label -> (words, pattern, labels)
+        for lbl in labels:
+            key = lbl.casefold()
+            if key not in self.keys:
+                self.keys[key] = (frozenset(WORD.findall(key)), re.compile(rf'\b{re.escape(lbl)}\b', re.I), [])
+            if lbl not in self.keys[key][2]:
+                self.keys[key][2].append(lbl)
+        self.direct = len(self.keys) <= direct_max
+
+    def labels(self) -> list:
+        return [lbl for *_, lbls in self.keys.values() for lbl in lbls]
+
+    def find(self, text, ranges=None) -> set:
+        # ranges: (start, end) pieces of text to search, default all of it
+        ranges = [(0, len(text))] if ranges is None else ranges
+        vocab = None if self.direct else set().union(*(vocabulary(text[s:e]) for s, e in ranges))
+        found = set()
+        for words, pat, lbls in self.keys.values():
+            if (vocab is None or words <= vocab) and any(pat.search(text, s, e) for s, e in ranges):
+                found.update(lbls)
+        return found
@@ -0,0 +1,138 @@
+import os
+import tempfile
+import threading
+from collections import deque
+
+# Latency quantiles are over this many most recent documents
+WINDOW = int(os.environ.get("CH_METRICS_WINDOW", "1000"))
+
+HELP = {
+    "ch_documents_total": ("counter", "Documents analysed, by outcome"),
+    "ch_pages_total": ("counter", "Pages analysed"),
+    "ch_chars_total": ("counter", "Characters of extracted text analysed"),
+    "ch_stage_seconds_total": ("counter", "Time spent per pipeline stage"),
+    "ch_extraction_cache_total": ("counter", "Extraction cache lookups, by result"),
+    "ch_analysis_seconds": ("summary", "Per-document analysis latency, extraction included"),
+    "ch_analyses_in_progress": ("gauge", "Documents being analysed now"),
+    "ch_jobs_queued": ("gauge", "Submitted documents waiting for a worker"),
+}
+
+def _num(v):
+    if isinstance(v, int):
+        return str(v)
+    return "NaN" if v != v else repr(round(float(v), 6))
+
+def _labels(labels):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else ""
+
+class Registry:
+    # Process-wide counters, gauges and latency summaries, rendered in the Prometheus
+    # text format. Analyses run in worker processes, so the registry is fed in the
+    # parent from each finished report (its "timings" block), not from inside the stages.
+    def __init__(self, window=WINDOW):
+        self._lock = threading.Lock()
+        self.values = {}   # (name, labels) -> value, for counters and gauges
+        self.samples = {}  # name -> recent observations
+        self.window = window
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.values[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value):
+        with self._lock:
+            self.samples.setdefault(name, deque(maxlen=self.window)).append(value)
+            self.values[(name + "_sum", ())] = self.values.get((name + "_sum", ()), 0) + value
+            self.values[(name + "_count", ())] = self.values.get((name + "_count", ()), 0) + 1
+
+    def record_report(self, report):
+        # count one finished document from its report dict ({"error": ...} counts as failed)
+        if "error" in report:
+            self.inc("ch_documents_total", status="failed")
+            return
+        self.inc("ch_documents_total", status="done")
+        t = report.get("timings")
+        if not t:
+            return
+        self.inc("ch_pages_total", t["pages"])
+        self.inc("ch_chars_total", t["chars"])
+        for stage, ms in t["stages_ms"].items():
+            self.inc("ch_stage_seconds_total", ms / 1000, stage=stage)
+        if t.get("extraction", {}).get("cache"):
+            self.inc("ch_extraction_cache_total", result=t["extraction"]["cache"])
+        self.observe("ch_analysis_seconds", t["total_ms"] / 1000)
+
+    def render(self) -> str:
+        with self._lock:
+            values = dict(self.values)
+            samples = {k: sorted(v) for k, v in self.samples.items()}
+        lines = []
+        for name, (kind, text) in HELP.items():
+            lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+            if kind == "summary":
+                vals = samples.get(name, [])
+                for q in (0.5, 0.95):
+                    v = vals[min(len(vals) - 1, int(q * len(vals)))] if vals else float("nan")
+                    lines.append(f'{name}{{quantile="{q}"}} {_num(v)}')
+                lines.append(f"{name}_sum {_num(values.get((name + '_sum', ()), 0))}")
+                lines.append(f"{name}_count {_num(values.get((name + '_count', ()), 0))}")
+                continue
+            for (n, labels), v in sorted(values.items()):
+                if n == name:
+                    lines.append(f"{name}{_labels(labels)} {_num(v)}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# --- exposition: an HTTP endpoint for servers, a flushed file for batch runs
+def serve(port, registry=REGISTRY, host="127.0.0.1"):
+    # GET /metrics on a daemon thread; -> the server (call shutdown() to stop)
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+def write_file(path, registry=REGISTRY):
+    # atomic, so a textfile collector never reads half a file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+class FileFlusher:
+    # Rewrites `path` every `interval` seconds until stop(), which writes it a last time.
+    def __init__(self, path, interval=15, registry=REGISTRY):
+        self.path, self.interval, self.registry = path, interval, registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-file", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            write_file(self.path, self.registry)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        write_file(self.path, self.registry)
@@ -0,0 +1,168 @@
+import io
+import os
+import sys
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .cli import write_json
+from .extract import pool_context
+from .kb import warm
+from .metrics import REGISTRY
+
+# Tasks per stage. read/write are file I/O driven from the event loop; extract/analyze
+# are CPU work in the shared process pool (None: the pool size, so either stage alone
+# can fill every core).
+LIMITS = {"read": 8, "extract": None, "analyze": None, "write": 4}
+
+# --- CPU stages, run in the pool
+def _extract(data, back_matter, cache):
+    # -> ([(page, seconds to decode it)], extraction stats)
+    from .extract import iter_pages
+    stats, out = {}, []
+    pages = iter_pages(io.BytesIO(data), workers=1, cache=None if cache else False, back_matter=back_matter,
+                       stats=stats)
+    t = time.perf_counter()
+    for page in pages:
+        now = time.perf_counter()
+        out.append((page, now - t))
+        t = now
+    return out, stats
+
+def _analyse(timed_pages, extraction):
+    from .analysis import StreamingAnalysis
+    stream = StreamingAnalysis()
+    t = stream.timings
+    t.extraction.update(extraction)
+    # the pages were decoded in another task: book that time as if they had streamed in
+    t.started -= sum(s for _, s in timed_pages)
+    for page, seconds in timed_pages:
+        t.page(page, seconds)
+        stream.feed(page)
+    return stream.report()
+
+# --- pipeline
+class CorpusPipeline:
+    # read -> extract -> analyze -> write, each stage a fixed number of tasks joined by
+    # bounded queues, so a slow stage stalls the ones before it instead of letting
+    # their output pile up: at most limit + queue documents are held per stage.
+    # Reads and writes run on the default thread pool (files have no async API); the
+    # manifest lives on a thread of its own, as sqlite connections stay on one thread.
+    def __init__(self, out_dir, manifest_path=None, workers=None, limits=None, queue=None, force=False,
+                 back_matter=False, cache=True, metrics=REGISTRY):
+        self.out_dir = out_dir
+        self.manifest_path = manifest_path or os.path.join(out_dir, "manifest.sqlite")
+        self.workers = workers or os.cpu_count() or 1
+        self.limits = {k: v or self.workers for k, v in {**LIMITS, **(limits or {})}.items()}
+        self.queue = queue or self.workers
+        self.force = force
+        self.back_matter = back_matter
+        self.cache = cache
+        self.metrics = metrics
+        self.analysed = self.skipped = self.failed = 0
+
+    async def run(self, paths):
+        # -> (analysed, skipped, failed)
+        from .analysis import PIPELINE_VERSION
+        from .kb import kb_hashes
+        from .manifest import Manifest, options_key
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.loop = asyncio.get_running_loop()
+        self.version, self.kb = PIPELINE_VERSION, kb_hashes()
+        self.options = options_key({"back_matter": self.back_matter})
+        self.db = ThreadPoolExecutor(max_workers=1, thread_name_prefix="manifest")
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context(),
+                                        initializer=warm)
+        self.manifest = await self._db(Manifest, self.manifest_path)
+        try:
+            names = ("read", "extract", "analyze", "write")
+            queues = [asyncio.Queue(self.queue) for _ in names]
+            stages = [self._stage(getattr(self, "_" + name), queues[i], queues[i + 1] if i < 3 else None,
+                                  self.limits[name], self.limits[names[i + 1]] if i < 3 else 0)
+                      for i, name in enumerate(names)]
+            await asyncio.gather(self._feed(paths, queues[0]), *stages)
+        finally:
+            await self._db(self.manifest.close)
+            self.db.shutdown()
+            self.pool.shutdown(cancel_futures=True)
+        return self.analysed, self.skipped, self.failed
+
+    def _db(self, fn, *args):
+        return self.loop.run_in_executor(self.db, fn, *args)
+
+    async def _feed(self, paths, q):
+        for path in paths:
+            await q.put(path)
+        for _ in range(self.limits["read"]):
+            await q.put(None)
+
+    async def _stage(self, fn, inq, outq, tasks, downstream):
+        # `tasks` workers take items from inq until the end marker (None), passing
+        # fn's results (None: nothing further to do) on to outq; the last one to stop
+        # sends the end marker on to each of the `downstream` workers
+        async def work():
+            while (item := await inq.get()) is not None:
+                out = await fn(item)
+                if out is not None:
+                    await outq.put(out)
+
+        await asyncio.gather(*(work() for _ in range(tasks)))
+        for _ in range(downstream):
+            await outq.put(None)
+
+    # each stage takes and returns a dict for one document: path, sha, stat, then data,
+    # pages or report as it moves along; a failed step sets "error" and skips to write
+    async def _read(self, path):
+        try:
+            fresh, sha, st = await self._db(self.manifest.check, path, self.kb, self.version, self.options)
+        except OSError as e:  # gone or unreadable: nothing to record it under
+            self.failed += 1
+            print(f"{path}: {type(e).__name__}: {e}", file=sys.stderr)
+            return None
+        if fresh and not self.force:
+            self.skipped += 1
+            return None
+        doc = {"path": path, "sha": sha, "stat": st}
+        try:
+            doc["data"] = await asyncio.to_thread(_read_bytes, path)
+        except OSError as e:
+            doc["error"] = f"{type(e).__name__}: {e}"
+        return doc
+
+    async def _cpu(self, doc, fn, *args):
+        try:
+            return await self.loop.run_in_executor(self.pool, fn, *args)
+        except Exception as e:
+            doc["error"] = f"{type(e).__name__}: {e}"
+
+    async def _extract(self, doc):
+        if "error" not in doc:
+            doc["pages"] = await self._cpu(doc, _extract, doc.pop("data"), self.back_matter, self.cache)
+        return doc
+
+    async def _analyze(self, doc):
+        if "error" not in doc:
+            doc["report"] = await self._cpu(doc, _analyse, *doc.pop("pages"))
+        return doc
+
+    async def _write(self, doc):
+        path, sha, st = doc["path"], doc["sha"], doc["stat"]
+        rec = {"file": path, **doc["report"]} if "error" not in doc else {"file": path, "error": doc["error"]}
+        self.metrics.record_report(rec)
+        output = None
+        if "error" in rec:
+            self.failed += 1
+            print(f"{path}: {rec['error']}", file=sys.stderr)
+        else:
+            output = os.path.join(self.out_dir, sha + ".json")
+            await asyncio.to_thread(write_json, output, rec)
+            self.analysed += 1
+        await self._db(self.manifest.record, path, st, sha, self.kb, self.version, output, self.options)
+
+def _read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def run_pipeline(paths, out_dir, manifest_path=None, workers=None, limits=None, queue=None, force=False, **opts):
+    # run_incremental() with the stages overlapped; -> (analysed, skipped, failed)
+    return asyncio.run(CorpusPipeline(out_dir, manifest_path, workers, limits, queue, force, **opts).run(paths))
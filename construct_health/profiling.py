@@ -0,0 +1,63 @@
+import os
+import pstats
+import cProfile
+import tempfile
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Where the app keeps profiles of uploads analysed with ?profile=1
+PROFILE_DIR = os.environ.get("CH_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "construct-health-profiles"))
+
+def profile_call(fn, *args, **kwargs):
+    # -> (fn's result, pstats.Stats of the call)
+    prof = cProfile.Profile()
+    result = prof.runcall(fn, *args, **kwargs)
+    return result, pstats.Stats(prof)
+
+def _label(func):
+    filename, line, name = func
+    if filename == "~":
+        return name  # built-in, e.g. "<method 'findall' of ...>"
+    return f"{os.path.splitext(os.path.basename(filename))[0]}:{name}:{line}".replace(";", ",")
+
+def collapsed_stacks(stats, min_us=1):
+    # Flamegraph "collapsed" lines ("a;b;c <microseconds>"). cProfile records caller ->
+    # callee edges rather than whole stacks, so each function's time on a path is its
+    # time from that caller, scaled by the share of the caller's time the path carries.
+    children = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, _, edge_ct) in callers.items():
+            children.setdefault(caller, []).append((func, edge_ct))
+    roots = [f for f, (*_, callers) in stats.stats.items() if not callers]
+    out = {}
+
+    def walk(func, ct, path):
+        tt, total = stats.stats[func][2], stats.stats[func][3]
+        share = ct / total if total else 0.0
+        path = path + (func,)
+        key = ";".join(map(_label, path))
+        out[key] = out.get(key, 0) + tt * share * 1e6
+        for child, edge_ct in children.get(func, ()):
+            if child not in path and edge_ct * share * 1e6 >= min_us:
+                walk(child, edge_ct * share, path)
+
+    for root in roots:
+        walk(root, stats.stats[root][3], ())
+    return [f"{k} {round(v)}" for k, v in out.items() if round(v) >= min_us]
+
+def hot_functions(stats, n=15):
+    # the package's own functions by self time: where the pipeline actually spends it
+    rows = []
+    for (filename, line, name), (_, calls, tt, ct, _) in stats.stats.items():
+        if os.path.abspath(filename).startswith(PACKAGE_DIR):
+            rows.append({"function": f"{os.path.basename(filename)}:{name}", "calls": calls,
+                         "self_ms": round(tt * 1000, 3), "cumulative_ms": round(ct * 1000, 3)})
+    return sorted(rows, key=lambda r: -r["self_ms"])[:n]
+
+def write_profile(stats, base):
+    # base.pstats (for pstats/snakeviz) and base.collapsed (for flamegraph.pl/speedscope)
+    # -> the report's "profile" block
+    stats.dump_stats(base + ".pstats")
+    with open(base + ".collapsed", "w", encoding="utf-8") as f:
+        f.write("\n".join(collapsed_stacks(stats)) + "\n")
+    return {"pstats": base + ".pstats", "collapsed": base + ".collapsed", "hot_functions": hot_functions(stats)}
@@ -0,0 +1,221 @@
+import os
+import sys
+import json
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from .extract import pool_context, spool
+from .kb import warm
+from .metrics import REGISTRY
+
+# Largest request body accepted (PDF or text); bigger ones get 413.
+MAX_MB = float(os.environ.get("CH_SERVICE_MAX_MB", "50"))
+# Requests waiting for a worker beyond the busy ones; past that, 503.
+QUEUE = int(os.environ.get("CH_SERVICE_QUEUE", "8"))
+# Seconds a request may wait for its report before 504.
+TIMEOUT = float(os.environ.get("CH_SERVICE_TIMEOUT", "300"))
+
+class Busy(Exception):
+    pass
+
+# --- worker side
+def _ready():
+    return os.getpid()
+
+def _analyse_pdf(path, back_matter):
+    from .analysis import analyze_pdf
+    return analyze_pdf(path, workers=1, back_matter=back_matter)
+
+def _analyse_text(text):
+    from .analysis import analyze_text
+    return analyze_text(text)
+
+# --- service
+class AnalysisService:
+    # A process pool started (and warmed: every worker spawned, KB compiled) up front,
+    # plus admission control: at most workers + queue requests are in flight, further
+    # ones are refused with Busy rather than piling up behind the pool.
+    def __init__(self, workers=None, queue=QUEUE, max_bytes=int(MAX_MB * 2**20), timeout=TIMEOUT,
+                 metrics=REGISTRY):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.metrics = metrics
+        self.capacity = self.workers + queue
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._pool = self._new_pool()
+
+    def _new_pool(self):
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context(), initializer=warm)
+        # submitted together, these start every worker now instead of on the first requests
+        for fut in [pool.submit(_ready) for _ in range(self.workers)]:
+            fut.result()
+        return pool
+
+    def analyze(self, data, kind="pdf", back_matter=False):
+        # data: the PDF's bytes, or text (kind="text"). -> the report dict (as the app's
+        # Raw / Export tab downloads it); raises Busy when saturated, TimeoutError, or
+        # whatever the analysis raised
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                raise Busy()
+            self.in_flight += 1
+            self._gauges()
+        path = None
+        try:
+            if kind == "text":
+                fn, args = _analyse_text, (data,)
+            else:
+                path = spool(data, "ch-req-")
+                fn, args = _analyse_pdf, (path, back_matter)
+            pool = self._pool
+            try:
+                fut = pool.submit(fn, *args)
+            except BrokenProcessPool:
+                # a worker died (out of memory, crash): start a fresh pool for this and later requests
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = self._new_pool()
+                fut = self._pool.submit(fn, *args)
+        except BaseException:
+            self._release(path)
+            raise
+        # the slot (and the spooled PDF) is held until the worker is done with it, not
+        # just until this request gives up waiting, so timeouts can't overfill the pool
+        fut.add_done_callback(lambda f: self._release(path))
+        try:
+            report = fut.result(self.timeout)
+        except TimeoutError:
+            fut.cancel()  # still queued: don't let it occupy a worker later
+            self.metrics.record_report({"error": "timeout"})
+            raise
+        except Exception as e:
+            self.metrics.record_report({"error": str(e)})
+            raise
+        self.metrics.record_report(report)
+        return report
+
+    def _release(self, path):
+        if path:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        with self._lock:
+            self.in_flight -= 1
+            self._gauges()
+
+    def _gauges(self):
+        # with self._lock held
+        self.metrics.set("ch_analyses_in_progress", min(self.in_flight, self.workers))
+        self.metrics.set("ch_jobs_queued", max(0, self.in_flight - self.workers))
+
+    def shutdown(self):
+        self._pool.shutdown(cancel_futures=True)
+
+# --- HTTP
+# POST /analyze          body: a PDF (application/pdf) or text (text/plain); ?back_matter=1
+#                        -> 200 report JSON | 400 | 411 | 413 | 422 analysis failed | 503 busy | 504
+# GET  /healthz          -> {"status": "ok", "workers": ..., "in_flight": ..., "capacity": ...}
+# GET  /metrics          -> Prometheus text format
+def make_server(service, port=8502, host="127.0.0.1"):
+    # -> a ThreadingHTTPServer (port 0: any free port, see server.server_address);
+    # call serve_forever() to run it
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, body, content_type="application/json", headers=()):
+            if not isinstance(body, bytes):
+                body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, code, message, headers=()):
+            self.close_connection = True  # the unread body, if any, can't be reused
+            self._send(code, {"error": message}, headers=headers)
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/healthz":
+                self._send(200, {"status": "ok", "workers": service.workers, "in_flight": service.in_flight,
+                                 "capacity": service.capacity})
+            elif path == "/metrics":
+                self._send(200, service.metrics.render().encode(), "text/plain; version=0.0.4; charset=utf-8")
+            else:
+                self._error(404, "not found")
+
+        def do_POST(self):
+            path, _, query = self.path.partition("?")
+            if path != "/analyze":
+                self._error(404, "not found")
+                return
+            length = self.headers.get("Content-Length")
+            if length is None:
+                self._error(411, "Content-Length required")
+                return
+            if not length.isdigit():
+                self._error(400, "bad Content-Length")
+                return
+            if int(length) > service.max_bytes:
+                self._error(413, f"body larger than {service.max_bytes} bytes")
+                return
+            data = self.rfile.read(int(length))
+            ctype = self.headers.get("Content-Type", "application/pdf").split(";")[0].strip().lower()
+            if ctype.startswith("text/"):
+                kind, data = "text", data.decode("utf-8", errors="replace")
+            elif data[:5] == b"%PDF-":
+                kind = "pdf"
+            else:
+                self._error(400, "expected a PDF or text/plain body")
+                return
+            back_matter = any(p in ("back_matter=1", "back_matter=true") for p in query.split("&"))
+            try:
+                report = service.analyze(data, kind, back_matter)
+            except Busy:
+                self._error(503, "all workers busy, retry later", headers=[("Retry-After", "1")])
+            except TimeoutError:
+                self._error(504, f"analysis took longer than {service.timeout:g} s")
+            except Exception as e:
+                self._error(422, f"{type(e).__name__}: {e}")
+            else:
+                self._send(200, report)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m construct_health.server",
+                                 description="Serve the construct-health analysis over HTTP (localhost by default).")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8502)
+    ap.add_argument("-w", "--workers", type=int, help="documents analysed in parallel (default: CPUs - 1)")
+    ap.add_argument("--queue", type=int, default=QUEUE, help="requests allowed to wait for a worker before 503")
+    ap.add_argument("--max-mb", type=float, default=MAX_MB, help="largest request body accepted, in MB")
+    ap.add_argument("--timeout", type=float, default=TIMEOUT, help="seconds before a request gets 504")
+    args = ap.parse_args(argv)
+
+    service = AnalysisService(args.workers, args.queue, int(args.max_mb * 2**20), args.timeout)
+    server = make_server(service, args.port, args.host)
+    print(f"serving on http://{args.host}:{server.server_address[1]} with {service.workers} workers", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import regex as re
+from bisect import bisect_right
+
+# --- sentence split: one scan over the original buffer, no normalised copy.
+# A sentence ends at ! or ? before whitespace, or at . before whitespace and a capital
+# or "(", unless the word ending in that . is a citation/reference abbreviation.
+SENT_END = re.compile(r'[.!?]\s+')
+ABBREV = frozenset(("al.", "e.g.", "i.e.", "cf.", "vs.", "p.", "pp.", "fig.", "figs.", "eq.", "eqs.", "vol.", "ch."))
+_ABBREV_LEN = max(map(len, ABBREV)) + 1
+
+def _trimmed(text, start, end):
+    while start < end and text[start].isspace(): start += 1
+    while end > start and text[end - 1].isspace(): end -= 1
+    return (start, end) if start < end else None
+
+def sentence_spans(text:str, pos=0, endpos=None):
+    # -> [(start, end)] into text[pos:endpos], whitespace-trimmed
+    endpos = len(text) if endpos is None else endpos
+    spans, start = [], pos
+    for m in SENT_END.finditer(text, pos, endpos):
+        end = m.start() + 1
+        if text[m.start()] == ".":
+            nxt = text[m.end():min(m.end() + 1, endpos)]
+            if not ("A" <= nxt <= "Z" or nxt == "("):
+                continue
+            # the word ending here, looking back no further than the longest abbreviation
+            word = text[max(start, end - _ABBREV_LEN):end].split()
+            if word and word[-1].lstrip("([\"'").lower() in ABBREV:
+                continue
+        span = _trimmed(text, start, end)
+        if span: spans.append(span)
+        start = m.end()
+    span = _trimmed(text, start, endpos)
+    if span: spans.append(span)
+    return spans
+
+def sentences(text:str):
+    # sentence strings, whitespace runs collapsed to single spaces
+    return [" ".join(text[s:e].split()) for s, e in sentence_spans(text)]
+
+class SentenceTable:
+    # A document's sentences, split once, with a bitmask per sentence of which of
+    # `patterns` ({name: compiled regex}) match in it. Each pattern runs once over each
+    # of `ranges` ((start, end) into text, e.g. focus_spans(); default the whole text)
+    # and its hits are assigned to sentences by offset. Sentences are numbered in range
+    # order. Patterns must not match across a sentence break and should accept any
+    # whitespace run where they expect a space; then this equals
+    # pattern.search(sentence) per sentence.
+    def __init__(self, text:str, patterns=None, ranges=None):
+        self.text = text
+        self.ranges = [(0, len(text))] if ranges is None else list(ranges)
+        self.spans = [sp for s, e in self.ranges for sp in sentence_spans(text, s, e)]
+        self.patterns = {}
+        self.masks = [0] * len(self.spans)
+        # ranges need not be in document order, so locate() bisects a sorted view
+        self._order = sorted(range(len(self.spans)), key=lambda k: self.spans[k][0])
+        self._starts = [self.spans[k][0] for k in self._order]
+        for name, pat in (patterns or {}).items():
+            self.add(name, pat)
+
+    def add(self, name, pattern):
+        # register a pattern under the next bit and mark the sentences it matches
+        bit = 1 << len(self.patterns)
+        self.patterns[name] = pattern
+        for s, e in self.ranges:
+            for m in pattern.finditer(self.text, s, e):
+                k = self.locate(m.start())
+                if k is not None:
+                    self.masks[k] |= bit
+
+    def locate(self, offset):
+        # index of the sentence containing text[offset], None outside every sentence
+        i = bisect_right(self._starts, offset) - 1
+        if i < 0:
+            return None
+        k = self._order[i]
+        return k if offset < self.spans[k][1] else None
+
+    def __len__(self):
+        return len(self.spans)
+
+    def sentence(self, k):
+        s, e = self.spans[k]
+        return " ".join(self.text[s:e].split())
+
+    def find(self, name, maxn=6):
+        # first maxn sentences matching the named pattern
+        bit = 1 << list(self.patterns).index(name)
+        out = []
+        for k, mask in enumerate(self.masks):
+            if mask & bit:
+                out.append(self.sentence(k))
+                if len(out) >= maxn: break
+        return out
+
+# --- sectionizer: sections are (name, start, end) spans over the text, found in one pass.
+# A heading is a section name at the start of a line, capitalised or upper case: optionally
+# numbered ("2.", "2.1", "II."), "General Discussion", "Results and Discussion". Either it
+# is the whole line (with a trailing ":" or "." allowed), or it runs in, followed on the
+# same line by ":", "." or a dash and the section's text ("Abstract: Self-control is ...").
+# The heading starts its section.
+SECTION_HEAD = re.compile(r'^[ \t]*(?:(?:\d+(?:\.\d+)*|[IVX]+)\.?[ \t]+)?(?:(?i:general)[ \t]+)?(?=[A-Z])'
+                          r'(?i:(Abstract|Introduction|Background|Theory|Method|Measure|Participant|Procedure'
+                          r'|Result|Discussion|Conclusion)s?)'
+                          r'(?:[ \t]+(?i:and|&)[ \t]+\w+)?'
+                          r'(?:[ \t]*[:.]?[ \t]*\r?$|[ \t]*(?:[:.]|[ \t]-|[–—])(?=[ \t]*\S))', re.M)
+SECTION_NAMES = {"abstract": "Abstract", "introduction": "Introduction", "background": "Background",
+                 "theory": "Theory", "method": "Method", "measure": "Measures", "participant": "Participants",
+                 "procedure": "Procedure", "result": "Results", "discussion": "Discussion", "conclusion": "Conclusion"}
+
+def section_name(m):
+    # canonical name of a SECTION_HEAD match: "METHODS" and "2. Method" are both "Method"
+    return SECTION_NAMES[m.group(1).lower()]
+
+def section_spans(text:str):
+    # -> [(name, start, end)] covering text in order; text before the first heading is "Full Text"
+    spans, name, start = [], "Full Text", 0
+    for m in SECTION_HEAD.finditer(text):
+        if m.start() > start:
+            spans.append((name, start, m.start()))
+        name, start = section_name(m), m.start()
+    if len(text) > start or not spans:
+        spans.append((name, start, len(text)))
+    return spans
+
+def sectionize(text:str):
+    # {name: text}; a section that recurs (one Method per study) is joined in document order
+    secs = {}
+    for name, start, end in section_spans(text):
+        secs.setdefault(name, []).append(text[start:end].strip())
+    return {k: "\n".join(v).strip() for k,v in secs.items()}
+
+# sections the detectors read, in this order
+FOCUS_SECS = ("Abstract", "Introduction", "Theory", "Method", "Measures", "Results", "Discussion")
+
+def focus_spans(spans):
+    # (start, end) of the focus sections: grouped in FOCUS_SECS order, document order within a name
+    rank = {name: i for i, name in enumerate(FOCUS_SECS)}
+    return [(s, e) for name, s, e in sorted((sp for sp in spans if sp[0] in rank), key=lambda sp: rank[sp[0]])]
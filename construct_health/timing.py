@@ -0,0 +1,44 @@
+import time
+from contextlib import contextmanager
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+class Timings:
+    # Monotonic (perf_counter) timings for one document: seconds per pipeline stage,
+    # summed over pages for the per-page stages, and one record per extracted page.
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.pages = []  # (number, seconds, chars, engine)
+        self.extraction = {}  # iter_pages(stats=...): whether the extraction cache hit
+
+    @contextmanager
+    def stage(self, name):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def page(self, page, seconds):
+        # seconds: how long the page took to arrive from the extractor
+        self.add("extract", seconds)
+        self.pages.append((page.number, seconds, len(page.text), page.engine))
+
+    def report(self):
+        engines = {}
+        for *_, engine in self.pages:
+            engines[engine or "none"] = engines.get(engine or "none", 0) + 1
+        return {
+            "pages": len(self.pages),
+            "chars": sum(chars for _, _, chars, _ in self.pages),
+            "engines": engines,
+            "extraction": self.extraction,
+            "total_ms": _ms(time.perf_counter() - self.started),
+            "stages_ms": {k: _ms(v) for k, v in self.stages.items()},
+            "per_page": [{"page": n, "ms": _ms(s), "chars": c, "engine": e} for n, s, c, e in self.pages],
+        }
@@ -1,203 +1,107 @@
+import os
+import time
 import streamlit as st
-import yaml, json, regex as re
-from io import BytesIO
-
-# Prefer PyMuPDF for cleaner text; fall back to pypdf
-def extract_text(file) -> str:
-    try:
-        import fitz  # PyMuPDF
-        doc = fitz.open(stream=file.read(), filetype="pdf")
-        txt = []
-        for page in doc:
-            txt.append(page.get_text("text"))
-        return "\n".join(txt)
-    except Exception:
-        file.seek(0)
-        from pypdf import PdfReader
-        txt = []
-        r = PdfReader(file)
-        for p in r.pages:
-            try:
-                t = p.extract_text()
-                if t: txt.append(t)
-            except: pass
-        return "\n".join(txt)
-
-# --- sentence split (simple, fast, robust for PDFs)
-SPLIT = re.compile(r'(?<=\.)\s+(?=[A-Z\(])|(?<=[!?])\s+')
-def sentences(text:str):
-    raw = re.sub(r'\s+', ' ', text)
-    return [s.strip() for s in SPLIT.split(raw) if s.strip()]
-
-# --- sectionizer
-SECTION_HEAD = re.compile(r'\b(Abstract|Introduction|Background|Theory|Method|Methods|Measures?|Participants?|Procedure|Results?|Discussion|Conclusion)s?\b', re.I)
-def sectionize(text:str):
-    secs = {}
-    current = "Full Text"
-    secs[current] = []
-    for line in text.splitlines():
-        if SECTION_HEAD.search(line.strip()):
-            current = SECTION_HEAD.search(line.strip()).group(0).title()
-            secs.setdefault(current, [])
-        secs[current].append(line)
-    return {k: "\n".join(v).strip() for k,v in secs.items()}
-
-# --- KB loaders
-import os, yaml
-@st.cache_data
-def load_kb():
-    with open("kb_constructs.yaml", "r", encoding="utf-8") as f:
-        kb_c = yaml.safe_load(f)
-    with open("kb_measures.yaml", "r", encoding="utf-8") as f:
-        kb_m = yaml.safe_load(f)
-    return kb_c, kb_m
-KB_CONS, KB_MEAS = load_kb()
-
-# --- Patterns
-RE_DEF      = re.compile(r'\b(is defined as|we define|defined as|refers to)\b', re.I)
-RE_BOUNDARY = re.compile(r'\b(distinct from|differs from|as opposed to|not merely|boundary|scope conditions?)\b', re.I)
-RE_THEORY   = re.compile(r'\b(model|mechanism|dual[\s-]?systems?|process model|expected value of control|valuation)\b', re.I)
-
-RE_DESIGN   = re.compile(r'\b(randomi[sz]ed|experiment|intervention|longitudinal|cross[- ]sectional|pre[- ]post|RCT)\b', re.I)
-
-RE_ALPHA    = re.compile(r'(?:cronbach[^a-zA-Z]*alpha|alpha)\s*(?:=|:)?\s*([0]\.\d{2,}|[1](?:\.0+)?)', re.I)
-RE_OMEGA    = re.compile(r'(?:omega|ω)\s*(?:=|:)?\s*([0]\.\d{2,}|[1](?:\.0+)?)', re.I)
-RE_TRT      = re.compile(r'(?:test[- ]?retest|ICC)\s*(?:=|:)?\s*([0]\.\d{2,}|[1](?:\.0+)?)', re.I)
-
-RE_CFI      = re.compile(r'CFI\s*(?:=|:)\s*(0\.\d{2,})', re.I)
-RE_TLI      = re.compile(r'TLI\s*(?:=|:)\s*(0\.\d{2,})', re.I)
-RE_RMSEA    = re.compile(r'RMSEA\s*(?:=|:)\s*(0\.\d{2,})', re.I)
-RE_SRMR     = re.compile(r'SRMR\s*(?:=|:)\s*(0\.\d{2,})', re.I)
-RE_INVAR    = re.compile(r'\b(configural|metric|scalar|strict)\s+invariance\b|\bmeasurement invariance\b|\bDIF\b', re.I)
-
-RE_VALIDITY = re.compile(r'\b(convergent|discriminant|criterion|predictive|known[- ]groups|response[- ]process)\b', re.I)
-
-# --- helpers
-def find_sents(blob, pattern, maxn=6):
-    sents = sentences(blob)
-    out = []
-    for s in sents:
-        if pattern.search(s):
-            out.append(s)
-        if len(out) >= maxn: break
-    return out
-
-def detect_constructs(text):
-    hits = {}
-    for key, node in KB_CONS["constructs"].items():
-        labels = node.get("canonical_labels", []) + node.get("near_neighbors", [])
-        for lbl in labels:
-            if re.search(rf'\b{re.escape(lbl)}\b', text, re.I):
-                hits.setdefault(key, set()).add(lbl)
-    return {k: sorted(v) for k,v in hits.items()}
-
-def detect_measures(text):
-    found = []
-    for meas, node in KB_MEAS["measures"].items():
-        for alias in node["aliases"]:
-            if re.search(rf'\b{re.escape(alias)}\b', text, re.I):
-                found.append({"measure": meas, "alias": alias, "type": node["type"], "targets": node["targets"]})
-                break
-    return found
-
-def map_measures_to_components(found):
-    buckets = {}
-    for item in found:
-        for t in item["targets"]:
-            buckets.setdefault(t, []).append(item["measure"])
-    return {k: sorted(set(v)) for k,v in buckets.items()}
-
-def extract_numbers(blob):
-    nums = {}
-    # reliability
-    alpha = [float(x) for x in RE_ALPHA.findall(blob)]
-    omega = [float(x) for x in RE_OMEGA.findall(blob)]
-    trt   = [float(x) for x in RE_TRT.findall(blob)]
-    # structure/fit
-    cfi   = [float(x) for x in RE_CFI.findall(blob)]
-    tli   = [float(x) for x in RE_TLI.findall(blob)]
-    rmsea = [float(x) for x in RE_RMSEA.findall(blob)]
-    srmr  = [float(x) for x in RE_SRMR.findall(blob)]
-    inv   = bool(RE_INVAR.search(blob))
-    nums["alpha"] = alpha
-    nums["omega"] = omega
-    nums["test_retest_or_ICC"] = trt
-    nums["CFI"] = cfi
-    nums["TLI"] = tli
-    nums["RMSEA"] = rmsea
-    nums["SRMR"] = srmr
-    nums["invariance_signal"] = inv
-    return nums
-
-def threshold_comments(nums):
-    comments = []
-    def any_ge(vals, thr): return any(v >= thr for v in vals) if vals else False
-    def any_le(vals, thr): return any(v <= thr for v in vals) if vals else False
-
-    if nums["alpha"]:
-        comments.append(f"α values: {nums['alpha']} ⇒ {'OK (≥ .70)' if any_ge(nums['alpha'], .70) else 'low'}")
-    if nums["omega"]:
-        comments.append(f"ω values: {nums['omega']} ⇒ {'OK (≥ .70)' if any_ge(nums['omega'], .70) else 'low'}")
-    if nums["test_retest_or_ICC"]:
-        comments.append(f"Test–retest/ICC: {nums['test_retest_or_ICC']} ⇒ {'OK (≥ .70 typical)' if any_ge(nums['test_retest_or_ICC'], .70) else 'low'}")
-    if nums["CFI"]:
-        comments.append(f"CFI: {nums['CFI']} ⇒ {'OK (≥ .95 good, ≥ .90 acceptable)' if any_ge(nums['CFI'], .90) else 'poor'}")
-    if nums["TLI"]:
-        comments.append(f"TLI: {nums['TLI']} ⇒ {'OK (≥ .95/.90)' if any_ge(nums['TLI'], .90) else 'poor'}")
-    if nums["RMSEA"]:
-        comments.append(f"RMSEA: {nums['RMSEA']} ⇒ {'OK (≤ .06 good, ≤ .08 acceptable)' if any_le(nums['RMSEA'], .08) else 'high'}")
-    if nums["SRMR"]:
-        comments.append(f"SRMR: {nums['SRMR']} ⇒ {'OK (≤ .08 typical)' if any_le(nums['SRMR'], .08) else 'high'}")
-    if nums["invariance_signal"]:
-        comments.append("Measurement invariance mentioned (check configural/metric/scalar).")
-    return comments
-
-def jingle_jangle(text, constructs_found, measures_found):
-    warns = []
-    ops = {m["measure"] for m in measures_found}
-    if "self-control" in constructs_found and "GritS" in ops:
-        warns.append("Jingle risk: paper labels ‘self-control’ but uses Grit-S (grit). Check boundaries.")
-    if "self-control" in constructs_found and "self-regulation" in constructs_found:
-        if not RE_BOUNDARY.search(text):
-            warns.append("Jangle risk: both ‘self-control’ and ‘self-regulation’ are used with no explicit differentiation.")
-    if any(m["type"]=="self-report" for m in measures_found) and any(m["type"]=="behavioral task" for m in measures_found):
-        warns.append("Method mix: self-report and behavioral tasks both present — mapping to theory should be explicit.")
-    return warns
+import json
+import hashlib
+from construct_health.kb import default_index
+from construct_health.jobs import JobQueue
+from construct_health.metrics import serve as serve_metrics
+
+# process-wide compiled KB, shared by every session; re-read on every rerun, so an
+# edited KB file takes effect (and changes the job key) without a restart
+KB = default_index()
+
+# Finished reports stay with the job queue, keyed by upload content hash + KB version +
+# options, so reruns (tab switches, downloads) don't re-analyse. Bounded in count and age.
+CACHE_ENTRIES = int(os.environ.get("CH_UI_CACHE_ENTRIES", "32"))
+CACHE_TTL = int(os.environ.get("CH_UI_CACHE_TTL", "3600"))
+
+@st.cache_resource
+def metrics_server():
+    # Prometheus endpoint (http://127.0.0.1:PORT/metrics) when CH_METRICS_PORT is set
+    port = os.environ.get("CH_METRICS_PORT")
+    return serve_metrics(int(port)) if port else None
+
+metrics_server()
+
+@st.cache_resource
+def job_queue():
+    # one worker pool for the whole server, however many sessions (cap: CH_JOB_WORKERS)
+    return JobQueue(keep=CACHE_ENTRIES, ttl=CACHE_TTL)
+
+def _values(vals):
+    return ", ".join(f"{v:g}" for v in vals)
+
+def summary_row(job):
+    # one line of the comparison table; columns fill in when the job is done
+    row = dict.fromkeys(("Paper", "Status", "Constructs", "Measures", "α", "ω", "CFI", "TLI", "RMSEA", "SRMR",
+                         "Warnings"), "")
+    row["Paper"] = job.name
+    row["Status"] = {"queued": "⏳ queued", "running": f"🔎 page {job.page}", "done": "✅ done",
+                     "failed": "❌ failed"}[job.status]
+    row["Constructs"] = ", ".join(job.constructs)
+    if job.status == "done":
+        r, n = job.result, job.result["numeric_indices"]
+        row.update({"Constructs": ", ".join(r["constructs_detected"]),
+                    "Measures": ", ".join(m["measure"] for m in r["measures_detected"]),
+                    "α": _values(n["alpha"]), "ω": _values(n["omega"]), "CFI": _values(n["CFI"]),
+                    "TLI": _values(n["TLI"]), "RMSEA": _values(n["RMSEA"]), "SRMR": _values(n["SRMR"]),
+                    "Warnings": str(len(r["warnings"]))})
+    return row
 
 st.set_page_config(page_title="Construct Health — SC/SRL", layout="wide")
 st.title("🧠 Construct Health — Self-Control / Self-Regulation (v2.1)")
 
-uploaded = st.file_uploader("📄 Upload a PDF", type=["pdf"])
-
-if uploaded:
-    with st.spinner("🔎 Parsing and analyzing…"):
-        blob = extract_text(uploaded)
-        secs = sectionize(blob)
-        focus = " ".join([
-            secs.get("Abstract",""),
-            secs.get("Introduction",""),
-            secs.get("Theory",""),
-            secs.get("Method","") + " " + secs.get("Measures",""),
-            secs.get("Results",""),
-            secs.get("Discussion","")
-        ])
-
-        constructs = detect_constructs(focus)
-        measures = detect_measures(focus)
-        comp_map = map_measures_to_components(measures)
-
-        nums = extract_numbers(focus)
-        num_comments = threshold_comments(nums)
-
-        defs = find_sents(focus, RE_DEF, 5)
-        bounds = find_sents(focus, RE_BOUNDARY, 5)
-        mech = find_sents(focus, RE_THEORY, 5)
-        design = find_sents(focus, RE_DESIGN, 5)
-        validity = find_sents(focus, RE_VALIDITY, 6)
-
-        jj = jingle_jangle(focus, constructs, measures)
-
-    st.success("✅ Analysis complete")
+uploads = st.file_uploader("📄 Upload PDFs", type=["pdf"], accept_multiple_files=True)
+back_matter = st.checkbox("Include references, appendices and supplementary pages", value=False)
+# ?profile=1 runs each upload under cProfile (a separate job from the unprofiled one)
+profile = st.query_params.get("profile", "").lower() in ("1", "true", "yes")
+if profile:
+    st.caption("⏱️ Profiling enabled — reports include a profile in the Raw / Export tab")
+
+if uploads:
+    queue = job_queue()
+    jobs = []
+    for up in uploads:
+        sha = hashlib.sha256(up.getvalue()).hexdigest()
+        jobs.append(queue.submit(up.getvalue(), up.name, (sha, KB.version, back_matter, profile), back_matter, profile))
+    jobs = list(dict.fromkeys(jobs))  # the same file uploaded twice is one job
+    n_done = sum(j.done for j in jobs)
+
+    # Redrawn every second while any job is pending, without re-running the whole
+    # script; each finished job reruns the page so its report becomes selectable below.
+    @st.fragment(run_every=1.0 if n_done < len(jobs) else None)
+    def comparison():
+        if sum(j.done for j in jobs) != n_done:
+            st.rerun()
+        st.dataframe([summary_row(j) for j in jobs], hide_index=True, width="stretch")
+
+    if len(jobs) > 1:
+        st.subheader("Comparison")
+    comparison()
+
+    for j in jobs:
+        if j.status == "failed":
+            st.error(f"{j.name}: analysis failed: {j.error}")
+            if st.button("Retry", key=f"retry-{j.id}"):
+                queue.retry(j.key)
+                st.rerun()
+    finished = [j for j in jobs if j.status == "done"]
+    if not finished:
+        st.stop()
+    job = finished[0]
+    if len(jobs) > 1:
+        by_id = {j.id: j for j in finished}
+        job = by_id[st.selectbox("Paper", list(by_id), format_func=lambda i: by_id[i].name)]
+    report = job.result
+    render_started = time.perf_counter()
+
+    constructs, measures, comp_map = report["constructs_detected"], report["measures_detected"], report["component_map"]
+    defs, bounds, mech = report["definition_sents"], report["boundary_sents"], report["theory_sents"]
+    design, validity = report["design_sents"], report["validity_sents"]
+    nums, num_comments, jj = report["numeric_indices"], report["numeric_comments"], report["warnings"]
+
+    st.success(f"✅ Analysis complete — {job.name}")
 
     c1,c2,c3 = st.columns(3)
     with c1:
@@ -245,24 +149,34 @@ if uploaded:
             st.info("No obvious jingle–jangle risks flagged.")
 
     with t5:
-        report = {
-            "constructs_detected": constructs,
-            "measures_detected": measures,
-            "component_map": comp_map,
-            "definition_sents": defs,
-            "boundary_sents": bounds,
-            "theory_sents": mech,
-            "design_sents": design,
-            "validity_sents": validity,
-            "numeric_indices": nums,
-            "numeric_comments": num_comments,
-            "warnings": jj
-        }
+        # this rerun's rendering time joins the stage breakdown (on a copy: the job's report is shared)
+        timings = report["timings"]
+        render_ms = round((time.perf_counter() - render_started) * 1000, 3)
+        report = {**report, "timings": {**timings, "stages_ms": {**timings["stages_ms"], "render": render_ms}}}
+        timings = report["timings"]
+        st.subheader("Timing breakdown")
+        engines = ", ".join(f"{e}: {n}" for e, n in timings["engines"].items()) or "none"
+        st.caption(f"{timings['pages']} pages · {timings['chars']:,} characters · engines {engines} · "
+                   f"analysis {timings['total_ms']:,.1f} ms")
+        st.dataframe([{"stage": k, "ms": v} for k, v in sorted(timings["stages_ms"].items(), key=lambda kv: -kv[1])],
+                     hide_index=True)
+        with st.expander("Per-page extraction"):
+            st.dataframe(timings["per_page"], hide_index=True)
+        if "profile" in report:
+            prof = report["profile"]
+            st.subheader("Profile — hot functions (self time)")
+            st.dataframe(prof["hot_functions"], hide_index=True)
+            st.caption(f"Saved to {prof['pstats']} and {prof['collapsed']}")
+            for key, mime in (("pstats", "application/octet-stream"), ("collapsed", "text/plain")):
+                if os.path.exists(prof[key]):
+                    with open(prof[key], "rb") as f:
+                        st.download_button(f"⬇️ Download .{key}", data=f.read(), file_name=os.path.basename(prof[key]),
+                                           mime=mime)
         st.subheader("Checklist JSON")
         st.json(report)
         st.download_button(
             "⬇️ Download JSON",
             data=json.dumps(report, indent=2).encode("utf-8"),
-            file_name="construct_health_sc_srl.json",
+            file_name=f"construct_health_{os.path.splitext(job.name)[0]}.json",
             mime="application/json"
         )